@@ -0,0 +1,173 @@
+"""Общая подготовка Django и данных для бенчмарков.
+
+Бенчмарки работают с временными базами SQLite; рабочая база, кэш,
+медиафайлы и метрики проекта не трогаются.
+"""
+import os
+import random
+import sys
+from io import BytesIO
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'yatube'))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yatube.settings')
+os.environ.setdefault('CACHE_BACKEND', 'locmem')
+os.environ.setdefault('THUMBNAIL_WORKERS', '0')
+
+WORDS = ('город', 'кот', 'утро', 'дорога', 'книга', 'море', 'поезд',
+         'работа', 'зима', 'музыка', 'сад', 'кофе', 'горы', 'друг', 'фото')
+
+
+def setup():
+    import django
+    from django.apps import apps
+    from django.conf import settings
+
+    django.setup()
+    settings.DEBUG = False
+    settings.MIGRATION_MODULES = {
+        app.label: None for app in apps.get_app_configs()}
+
+
+def use_database(path, **overrides):
+    """Переключает default на новый файл и создаёт в нём схему.
+
+    overrides заменяют ключи DATABASES['default'], например ENGINE.
+    Метрики и картинки пишутся в тот же временный каталог.
+    """
+    from django.conf import settings
+    from django.core.management import call_command
+    from django.db import connections
+
+    directory = os.path.dirname(path)
+    settings.METRICS_DB = os.path.join(directory, 'metrics.sqlite3')
+    settings.MEDIA_ROOT = os.path.join(directory, 'media')
+    connections.close_all()
+    database = connections.databases['default']
+    database.update(overrides, NAME=path)
+    if hasattr(connections._connections, 'default'):
+        delattr(connections._connections, 'default')
+    call_command('migrate', run_syncdb=True, verbosity=0)
+
+
+def seed(posts, users, groups, follows):
+    """Создаёт пользователей, группы, посты и подписки без сигналов.
+
+    Возвращает id пользователей, id групп и пары (подписчик, автор).
+    """
+    from django.db import connection
+
+    from posts.models import Follow, Group, Post, User
+
+    rng = random.Random(0)
+    words = random.Random(3)
+    User.objects.bulk_create(
+        (User(username=f'user{i}') for i in range(users)), batch_size=500)
+    Group.objects.bulk_create(
+        Group(title=f'Группа {i}', slug=f'group-{i}', description='')
+        for i in range(groups))
+    user_ids = list(User.objects.values_list('pk', flat=True))
+    group_ids = [None, *Group.objects.values_list('pk', flat=True)]
+    Post.objects.bulk_create(
+        (Post(author_id=rng.choice(user_ids), group_id=rng.choice(group_ids),
+              text=f'Пост {i}: ' + ' '.join(words.choices(WORDS, k=12)))
+         for i in range(posts)),
+        batch_size=500)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "UPDATE posts_post SET pub_date = "
+            "datetime('now', '-' || ((id * 7919) % 525600) || ' minutes')")
+    pairs = set()
+    while len(pairs) < min(follows, users * (users - 1)):
+        user, author = rng.sample(user_ids, 2)
+        pairs.add((user, author))
+    Follow.objects.bulk_create(
+        (Follow(user_id=user, author_id=author) for user, author in pairs),
+        batch_size=500)
+    return user_ids, group_ids[1:], sorted(pairs)
+
+
+def seed_images(fraction, files=20):
+    """Добавляет картинки к доле fraction постов.
+
+    Создаётся files разных JPEG 1600x900, посты ссылаются на них по кругу.
+    """
+    from django.core.files.base import ContentFile
+    from django.core.files.storage import default_storage
+    from PIL import Image
+
+    from posts.models import Post
+
+    rng = random.Random(1)
+    names = []
+    for number in range(files):
+        image = Image.new('RGB', (1600, 900), tuple(
+            rng.randrange(256) for _ in range(3)))
+        output = BytesIO()
+        image.save(output, 'JPEG', quality=85)
+        names.append(default_storage.save(
+            f'posts/bench_{number}.jpg', ContentFile(output.getvalue())))
+    posts = list(Post.objects.only('pk').order_by('pk'))
+    posts = rng.sample(posts, int(len(posts) * fraction))
+    for number, post in enumerate(posts):
+        post.image = names[number % files]
+    Post.objects.bulk_update(posts, ['image'], batch_size=500)
+
+
+def seed_comments(post_ids, user_ids, threads, depth, replies):
+    """Деревья комментариев MPTT к постам post_ids.
+
+    У каждого поста threads веток, у каждого комментария до глубины
+    depth по replies ответов. bulk_create не заполняет pk в SQLite,
+    поэтому id задаются явно, а поля дерева считает rebuild().
+    """
+    from django.db.models import Max
+
+    from posts.models import Comment
+
+    rng = random.Random(2)
+    next_id = (Comment.objects.aggregate(last=Max('pk'))['last'] or 0) + 1
+    level = [(post_id, None) for post_id in post_ids for _ in range(threads)]
+    for number in range(depth):
+        comments = []
+        for post_id, parent_id in level:
+            comments.append(Comment(
+                id=next_id, post_id=post_id, parent_id=parent_id,
+                author_id=rng.choice(user_ids),
+                text=f'Комментарий уровня {number}',
+                lft=0, rght=0, tree_id=0, level=0))
+            next_id += 1
+        Comment.objects.bulk_create(comments, batch_size=500)
+        level = [(comment.post_id, comment.pk) for comment in comments
+                 for _ in range(replies)]
+    Comment.objects.rebuild()
+
+
+def seed_heavy_author(user_ids, followers):
+    """Автор, на которого подписаны followers пользователей.
+
+    Возвращает id автора; его посты не раскладываются по лентам, если
+    followers не меньше FEED_FANOUT_LIMIT.
+    """
+    from posts.models import Follow
+
+    author_id, *readers = user_ids[:followers + 1]
+    Follow.objects.bulk_create(
+        (Follow(user_id=user_id, author_id=author_id) for user_id in readers),
+        batch_size=500, ignore_conflicts=True)
+    return author_id
+
+
+def finish_seed():
+    """Пересчитывает счётчики и раскладывает посты по лентам подписок."""
+    from django.db import connection
+
+    from posts.counters import rebuild_counters
+    from posts.feeds import rebuild_feeds
+    from posts.search import rebuild_index
+
+    rebuild_counters()
+    rebuild_index()
+    rebuild_feeds()
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE')
@@ -0,0 +1,123 @@
+"""Смешанная нагрузка чтения и записи на страницы постов в несколько потоков.
+
+Сравнивает обычный SQLite (журнал отката, отложенные транзакции, новое
+соединение на каждый запрос) с настройками из settings.DATABASES.
+Запуск из корня репозитория:
+
+    python benchmarks/concurrency.py --threads 8 --requests 200
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import threading
+import time
+from collections import Counter
+
+from common import seed, setup, use_database
+
+PLAIN = {
+    'ENGINE': 'django.db.backends.sqlite3',
+    'CONN_MAX_AGE': 0,
+    'OPTIONS': {},
+}
+
+
+def worker(number, args, data, results):
+    from django.db import connections
+    from django.test import Client
+
+    from posts.models import Group, Post, User
+
+    user_ids = data[0]
+    rng = random.Random(number)
+    client = Client()
+    client.force_login(User.objects.get(pk=rng.choice(user_ids)))
+    usernames = list(User.objects.values_list('username', flat=True)[:50])
+    slugs = list(Group.objects.values_list('slug', flat=True))
+    post_ids = list(Post.objects.values_list('pk', flat=True)[:200])
+    reads = (
+        lambda: client.get('/'),
+        lambda: client.get(f'/group/{rng.choice(slugs)}/'),
+        lambda: client.get(f'/profile/{rng.choice(usernames)}/'),
+        lambda: client.get(f'/posts/{rng.choice(post_ids)}/'),
+    )
+    writes = (
+        lambda: client.post('/create/', {'text': f'Нагрузка {number}'}),
+        lambda: client.post(f'/posts/{rng.choice(post_ids)}/comment/',
+                            {'text': f'Комментарий {number}'}),
+    )
+    for _ in range(args.requests):
+        request = rng.choice(
+            writes if rng.random() < args.writes else reads)
+        started = time.perf_counter()
+        try:
+            request()
+            outcome = 'ok'
+        except Exception as error:
+            outcome = f'{type(error).__name__}: {error}'
+        results.append((time.perf_counter() - started, outcome))
+    connections.close_all()
+
+
+def run(args, directory, name, overrides):
+    use_database(os.path.join(directory, f'{name}.sqlite3'), **overrides)
+    data = seed(args.posts, args.users, args.groups, args.follows)
+    results = []
+    threads = [threading.Thread(target=worker, args=(i, args, data, results))
+               for i in range(args.threads)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    timings = sorted(duration * 1000 for duration, _ in results)
+    outcomes = Counter(outcome for _, outcome in results)
+    return {
+        'rps': len(results) / elapsed,
+        'p50': statistics.median(timings),
+        'p95': timings[int(len(timings) * 0.95) - 1],
+        'errors': sum(count for outcome, count in outcomes.items()
+                      if outcome != 'ok'),
+        'outcomes': outcomes,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=100,
+                        help='запросов на поток')
+    parser.add_argument('--writes', type=float, default=0.2,
+                        help='доля запросов на запись')
+    parser.add_argument('--posts', type=int, default=5000)
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--groups', type=int, default=20)
+    parser.add_argument('--follows', type=int, default=2000)
+    args = parser.parse_args()
+
+    setup()
+    from django.db import connections
+    tuned = dict(connections.databases['default'])
+    configs = {'plain': PLAIN, 'tuned': tuned}
+    reports = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for name, overrides in configs.items():
+            reports[name] = run(args, directory, name, overrides)
+        connections.close_all()
+
+    print(f'{"конфигурация":<14}{"запр/с":>10}{"p50, мс":>10}'
+          f'{"p95, мс":>10}{"ошибки":>10}')
+    for name, report in reports.items():
+        print(f'{name:<14}{report["rps"]:>10.1f}{report["p50"]:>10.1f}'
+              f'{report["p95"]:>10.1f}{report["errors"]:>10}')
+    for name, report in reports.items():
+        for outcome, count in report['outcomes'].most_common():
+            if outcome != 'ok':
+                print(f'{name}: {count} x {outcome}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+"""Планы и время запросов лент до и после индексов постов и подписок.
+
+Запуск из корня репозитория:
+
+    python benchmarks/indexes.py --posts 50000 --users 1000
+
+Данные создаются во временной базе SQLite; рабочая база не трогается.
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from common import seed, setup, use_database
+
+
+def workload(user_ids, group_ids, pairs):
+    from posts.models import Follow, Post
+
+    rng = random.Random(1)
+    feed = Post.objects.select_related('author', 'group')
+    return {
+        'index': lambda: feed.all()[:10],
+        'index, page 50': lambda: feed.all()[490:500],
+        'group_posts': lambda: feed.filter(
+            group_id=rng.choice(group_ids))[:10],
+        'profile': lambda: feed.filter(author_id=rng.choice(user_ids))[:10],
+        'follow check': lambda: Follow.objects.filter(
+            user_id=rng.choice(user_ids),
+            author_id=rng.choice(user_ids)).values('pk')[:1],
+        'followers': lambda: Follow.objects.filter(
+            author_id=rng.choice(pairs)[1]).values('user_id'),
+    }
+
+
+def query_plan(queryset):
+    from django.db import connection
+
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+        return '; '.join(row[-1] for row in cursor.fetchall())
+
+
+def measure(queries, repeat):
+    from django.db import connection
+
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE')
+    results = {}
+    for name, make in queries.items():
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            list(make())
+            timings.append((time.perf_counter() - started) * 1000)
+        results[name] = (statistics.median(timings), query_plan(make()))
+    return results
+
+
+def toggle_indexes(enabled):
+    from django.db import connection
+
+    from posts.models import Follow, Post
+
+    constraints = Follow._meta.constraints
+    with connection.schema_editor() as editor:
+        for index in Post._meta.indexes:
+            (editor.add_index if enabled else editor.remove_index)(
+                Post, index)
+        # SQLite пересоздаёт таблицу по Meta модели, поэтому на время
+        # удаления ограничения Meta должна его не содержать.
+        Follow._meta.constraints = constraints if enabled else []
+        for constraint in constraints:
+            (editor.add_constraint if enabled else editor.remove_constraint)(
+                Follow, constraint)
+        Follow._meta.constraints = constraints
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--posts', type=int, default=20000)
+    parser.add_argument('--users', type=int, default=500)
+    parser.add_argument('--groups', type=int, default=50)
+    parser.add_argument('--follows', type=int, default=5000)
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        setup()
+        use_database(os.path.join(directory, 'bench.sqlite3'))
+        data = seed(args.posts, args.users, args.groups, args.follows)
+        toggle_indexes(False)
+        before = measure(workload(*data), args.repeat)
+        toggle_indexes(True)
+        after = measure(workload(*data), args.repeat)
+
+    print(f'{"запрос":<20}{"без индексов, мс":>18}{"с индексами, мс":>18}')
+    for name, (elapsed, _) in before.items():
+        print(f'{name:<20}{elapsed:>18.3f}{after[name][0]:>18.3f}')
+    for name in before:
+        print(f'\n{name}\n  до:    {before[name][1]}'
+              f'\n  после: {after[name][1]}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+"""Время ответа главной страницы с кэшем скомпилированных шаблонов и без.
+
+Сравниваются загрузчики без кэша (шаблоны разбираются на каждый запрос,
+как при DEBUG), кэширующий загрузчик на первом запросе после старта и
+он же после core.template_cache.warm_up(). Кэш данных прогрет, чтобы
+разница приходилась на загрузку шаблонов.
+Запуск из корня репозитория:
+
+    python benchmarks/templates.py --repeat 50
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from common import seed, setup, use_database
+
+LOADERS = [
+    'django.template.loaders.filesystem.Loader',
+    'django.template.loaders.app_directories.Loader',
+]
+
+
+def use_loaders(loaders):
+    from core.template_cache import _django_engines
+
+    for engine in _django_engines():
+        engine.loaders = loaders
+        engine.__dict__.pop('template_loaders', None)
+
+
+def request(client, url):
+    started = time.perf_counter()
+    response = client.get(url)
+    elapsed = (time.perf_counter() - started) * 1000
+    if response.status_code != 200:
+        raise RuntimeError(f'{url}: ответ {response.status_code}')
+    return elapsed
+
+
+def measure(url, repeat):
+    from django.conf import settings
+    from django.test import Client
+
+    from core import template_cache
+
+    client = Client()
+    request(client, url)
+    results = {}
+
+    use_loaders(LOADERS)
+    results['без кэша'] = min(request(client, url) for _ in range(repeat))
+
+    settings.TEMPLATE_CACHE = True
+    use_loaders([('django.template.loaders.cached.Loader', LOADERS)])
+    first = []
+    for _ in range(repeat):
+        template_cache.reset()
+        first.append(request(client, url))
+    results['кэш, первый запрос'] = min(first)
+
+    template_cache.reset()
+    compiled = template_cache.warm_up()
+    results[f'кэш после warm_up ({compiled} шаблонов)'] = min(
+        request(client, url) for _ in range(repeat))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=30)
+    parser.add_argument('--url', default='/')
+    parser.add_argument('--posts', type=int, default=2000)
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--groups', type=int, default=20)
+    parser.add_argument('--follows', type=int, default=2000)
+    args = parser.parse_args()
+
+    setup()
+    with tempfile.TemporaryDirectory() as directory:
+        use_database(os.path.join(directory, 'bench.sqlite3'))
+        seed(args.posts, args.users, args.groups, args.follows)
+        results = measure(args.url, args.repeat)
+        from django.db import connections
+        connections.close_all()
+
+    print(f'{"загрузчик":<36}{"мс":>10}')
+    for name, elapsed in results.items():
+        print(f'{name:<36}{elapsed:>10.2f}')
+
+
+if __name__ == '__main__':
+    main()
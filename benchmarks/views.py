@@ -0,0 +1,237 @@
+"""Время ответа и число SQL-запросов страниц постов с сохранёнными базами.
+
+Данные генерируются с фиксированным зерном: пользователи, группы,
+посты с картинками, глубокие деревья комментариев и автор с тысячами
+подписчиков. Каждая страница замеряется с пустым кэшем и с прогретым;
+как и в timeit, время — лучшее из --repeat запросов, оно меньше всего
+зависит от шума машины.
+Запуск из корня репозитория:
+
+    python benchmarks/views.py --scale small            # сравнить с базой
+    python benchmarks/views.py --scale small --save     # обновить базу
+
+Базы лежат в benchmarks/baselines/<scale>.json. Число запросов не должно
+расти вовсе, время — не больше чем на --tolerance и --min-delta; время
+зависит от машины, поэтому базу для сравнения времени стоит снимать на
+ней же, а на общих машинах CI сравнивать только запросы (--queries-only).
+Код выхода 1 означает регрессию.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from common import (ROOT, finish_seed, seed, seed_comments, seed_heavy_author,
+                    seed_images, setup, use_database)
+
+BASELINES = os.path.join(ROOT, 'benchmarks', 'baselines')
+SCALES = {
+    'small': {
+        'posts': 2000, 'users': 200, 'groups': 20, 'follows': 2000,
+        'images': 0.3, 'deep_posts': 5, 'threads': 10, 'depth': 4,
+        'replies': 2, 'heavy_followers': 150, 'fanout_limit': 100,
+    },
+    'medium': {
+        'posts': 20000, 'users': 2000, 'groups': 50, 'follows': 20000,
+        'images': 0.3, 'deep_posts': 20, 'threads': 20, 'depth': 4,
+        'replies': 3, 'heavy_followers': 1200, 'fanout_limit': 1000,
+    },
+    'large': {
+        'posts': 200000, 'users': 10000, 'groups': 200, 'follows': 100000,
+        'images': 0.3, 'deep_posts': 50, 'threads': 30, 'depth': 5,
+        'replies': 3, 'heavy_followers': 5000, 'fanout_limit': 1000,
+    },
+}
+
+
+def generate(scale):
+    """Заполняет базу и возвращает страницы для замеров.
+
+    Страница — пара (адрес, имя пользователя или None для гостя).
+    """
+    from django.conf import settings
+
+    from posts.models import Comment, Group, Post, User
+
+    settings.FEED_FANOUT_LIMIT = scale['fanout_limit']
+    user_ids, _, pairs = seed(scale['posts'], scale['users'],
+                              scale['groups'], scale['follows'])
+    seed_images(scale['images'])
+    deep = list(Post.objects.order_by('pk').values_list(
+        'pk', flat=True)[:scale['deep_posts']])
+    seed_comments(deep, user_ids, scale['threads'], scale['depth'],
+                  scale['replies'])
+    heavy_author = seed_heavy_author(user_ids, scale['heavy_followers'])
+    finish_seed()
+
+    usernames = dict(User.objects.values_list('pk', 'username'))
+    reader, author = next((user, author) for user, author in pairs
+                          if author != heavy_author)
+    plain_post = Post.objects.filter(comments_count=0).order_by('pk').first()
+    thread = Comment.objects.root_nodes().filter(post_id=deep[0]).first()
+    return {
+        'index': ('/', None),
+        'index, page 20': ('/?page=20', None),
+        'group_posts': (
+            f'/group/{Group.objects.order_by("pk").first().slug}/', None),
+        'profile': (f'/profile/{usernames[author]}/', usernames[reader]),
+        'profile, heavy author': (
+            f'/profile/{usernames[heavy_author]}/', usernames[reader]),
+        'post_detail': (f'/posts/{plain_post.pk}/', usernames[reader]),
+        'post_detail, deep comments': (
+            f'/posts/{deep[0]}/', usernames[reader]),
+        'comment_replies': (
+            f'/posts/comment/{thread.pk}/replies/', None),
+        'follow_index': ('/follow/', usernames[reader]),
+        'follow_index, heavy follower': (
+            '/follow/', usernames[user_ids[1]]),
+        'search': ('/search/?q=кот+море', None),
+    }
+
+
+def measure(url, username, repeat):
+    from django.core.cache import cache
+    from django.db import connection
+    from django.test import Client
+    from django.test.utils import CaptureQueriesContext
+
+    from posts.models import User
+
+    client = Client()
+    if username:
+        client.force_login(User.objects.get(username=username))
+
+    def request(cold):
+        if cold:
+            cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            response = client.get(url)
+            elapsed = (time.perf_counter() - started) * 1000
+        if response.status_code != 200:
+            raise RuntimeError(f'{url}: ответ {response.status_code}')
+        return elapsed, len(queries)
+
+    result = {}
+    for mode, cold in (('cold', True), ('warm', False)):
+        request(cold)
+        timings, queries = zip(*(request(cold) for _ in range(repeat)))
+        result[f'{mode}_ms'] = round(min(timings), 3)
+        result[f'{mode}_queries'] = max(queries)
+    return result
+
+
+def compare(results, baseline, tolerance, min_delta, queries_only=False):
+    """Список регрессий относительно baseline."""
+    regressions = []
+    for name, values in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        for mode in ('cold', 'warm'):
+            queries, base_queries = (values[f'{mode}_queries'],
+                                     base[f'{mode}_queries'])
+            if queries > base_queries:
+                regressions.append(
+                    f'{name}, {mode}: запросов {base_queries} -> {queries}')
+            elapsed, base_elapsed = values[f'{mode}_ms'], base[f'{mode}_ms']
+            if queries_only:
+                continue
+            if (elapsed > base_elapsed * (1 + tolerance)
+                    and elapsed - base_elapsed > min_delta):
+                regressions.append(
+                    f'{name}, {mode}: {base_elapsed:.1f} -> {elapsed:.1f} мс')
+    return regressions
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+            stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scale', choices=SCALES, default='small')
+    for key, value in SCALES['small'].items():
+        parser.add_argument(f'--{key.replace("_", "-")}', type=type(value),
+                            help='вместо значения из --scale')
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--only', nargs='+', metavar='PAGE',
+                        help='замерить только эти страницы')
+    parser.add_argument('--baseline',
+                        help='файл базы; по умолчанию по имени --scale')
+    parser.add_argument('--save', action='store_true',
+                        help='записать результаты как новую базу')
+    parser.add_argument('--tolerance', type=float, default=0.5,
+                        help='допустимый рост времени, доля')
+    parser.add_argument('--min-delta', type=float, default=2,
+                        help='рост времени меньше стольких мс не регрессия')
+    parser.add_argument('--queries-only', action='store_true',
+                        help='сравнивать с базой только число запросов')
+    args = parser.parse_args()
+    scale = {key: getattr(args, key) if getattr(args, key) is not None
+             else value for key, value in SCALES[args.scale].items()}
+    baseline_path = args.baseline or os.path.join(
+        BASELINES, f'{args.scale}.json')
+
+    setup()
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        use_database(os.path.join(directory, 'bench.sqlite3'))
+        pages = generate(scale)
+        for name, (url, username) in pages.items():
+            if args.only and name not in args.only:
+                continue
+            results[name] = measure(url, username, args.repeat)
+        from django.db import connections
+        connections.close_all()
+
+    baseline = {}
+    if os.path.exists(baseline_path):
+        with open(baseline_path) as file:
+            baseline = json.load(file)['results']
+    print(f'{"страница":<30}{"холодный, мс":>14}{"SQL":>6}'
+          f'{"тёплый, мс":>12}{"SQL":>6}{"база, мс":>10}')
+    for name, values in results.items():
+        base = baseline.get(name, {}).get('cold_ms')
+        print(f'{name:<30}{values["cold_ms"]:>14.1f}'
+              f'{values["cold_queries"]:>6}{values["warm_ms"]:>12.1f}'
+              f'{values["warm_queries"]:>6}'
+              f'{base if base is not None else "—":>10}')
+
+    if args.save:
+        os.makedirs(os.path.dirname(baseline_path), exist_ok=True)
+        with open(baseline_path, 'w') as file:
+            json.dump({
+                'meta': {
+                    'revision': git_revision(),
+                    'date': datetime.now().isoformat(timespec='seconds'),
+                    'python': platform.python_version(),
+                    'machine': platform.machine(),
+                    'scale': scale,
+                    'repeat': args.repeat,
+                },
+                'results': results,
+            }, file, ensure_ascii=False, indent=2)
+            file.write('\n')
+        print(f'База сохранена в {baseline_path}')
+        return
+    regressions = compare(results, baseline, args.tolerance,
+                          args.min_delta, args.queries_only)
+    for regression in regressions:
+        print(f'Регрессия: {regression}')
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
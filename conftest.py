@@ -0,0 +1,13 @@
+import pytest
+
+
+@pytest.fixture(autouse=True, scope='session')
+def cache_outside_project():
+    """Кэш и метрики тестов не пишутся в файлы рабочего сервера."""
+    from django.conf import settings
+
+    assert settings.TESTING
+    assert not settings.THUMBNAIL_WORKERS
+    assert not settings.CACHES['default'].get(
+        'LOCATION', '').startswith(settings.BASE_DIR)
+    assert not settings.METRICS_DB.startswith(settings.BASE_DIR)
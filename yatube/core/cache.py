@@ -0,0 +1,192 @@
+"""Кэш в файле SQLite, общий для всех процессов одного сервера.
+
+Не требует внешних сервисов: воркеры WSGI открывают один и тот же файл,
+поэтому страница, закэшированная одним процессом, отдаётся всеми.
+Записи вытесняются по давности последнего чтения (LRU), когда превышены
+MAX_ENTRIES или MAX_SIZE (суммарный размер значений в байтах).
+
+Чтение не должно становиться записью, которая ждёт блокировку файла,
+поэтому время чтения обновляется не чаще раза в ACCESS_RESOLUTION секунд,
+а размер кэша проверяется раз в CULL_EVERY записей.
+"""
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS cache (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    expires REAL,
+    accessed REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed);
+'''
+
+
+class SQLiteCache(BaseCache):
+    pickle_protocol = pickle.HIGHEST_PROTOCOL
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        self._path = location
+        options = params.get('OPTIONS', {})
+        self._max_size = options.get('MAX_SIZE')
+        self._busy_timeout = options.get('BUSY_TIMEOUT', 5)
+        self._access_resolution = options.get('ACCESS_RESOLUTION', 60)
+        self._cull_every = options.get('CULL_EVERY', 100)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._writes = 0
+
+    @property
+    def _db(self):
+        local = self._local
+        if getattr(local, 'pid', None) != os.getpid():
+            directory = os.path.dirname(self._path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            db = sqlite3.connect(self._path, timeout=self._busy_timeout,
+                                 isolation_level=None)
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute('PRAGMA synchronous=NORMAL')
+            db.executescript(SCHEMA)
+            local.db, local.pid = db, os.getpid()
+        return local.db
+
+    @contextmanager
+    def _transaction(self):
+        """Транзакция, сразу берущая блокировку записи файла."""
+        db = self._db
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            yield db
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+        db.execute('COMMIT')
+
+    def _key(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    def _expires(self, timeout):
+        return self.get_backend_timeout(timeout)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        now = time.time()
+        row = self._row(key, value, timeout, now)
+        with self._transaction() as db:
+            db.execute('DELETE FROM cache WHERE key = ? AND expires <= ?',
+                       (key, now))
+            added = db.execute(
+                'INSERT OR IGNORE INTO cache '
+                '(key, value, size, expires, accessed) VALUES (?, ?, ?, ?, ?)',
+                row).rowcount
+        if added:
+            self._maybe_cull(1)
+        return bool(added)
+
+    def get(self, key, default=None, version=None):
+        return self.get_many([key], version=version).get(key, default)
+
+    def get_many(self, keys, version=None):
+        keys = {self._key(key, version): key for key in keys}
+        if not keys:
+            return {}
+        now = time.time()
+        marks = ', '.join('?' * len(keys))
+        rows = self._db.execute(
+            f'SELECT key, value, accessed FROM cache WHERE key IN ({marks}) '
+            f'AND (expires IS NULL OR expires > ?)',
+            (*keys, now)).fetchall()
+        stale = [key for key, _, accessed in rows
+                 if now - accessed >= self._access_resolution]
+        if stale:
+            with self._transaction() as db:
+                db.execute(
+                    f'UPDATE cache SET accessed = ? WHERE key IN '
+                    f'({", ".join("?" * len(stale))})', (now, *stale))
+        return {keys[key]: pickle.loads(value) for key, value, _ in rows}
+
+    def _row(self, key, value, timeout, now):
+        pickled = pickle.dumps(value, self.pickle_protocol)
+        return key, pickled, len(pickled), self._expires(timeout), now
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.set_many({key: value}, timeout, version)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        now = time.time()
+        rows = [self._row(self._key(key, version), value, timeout, now)
+                for key, value in data.items()]
+        with self._transaction() as db:
+            db.executemany(
+                'INSERT OR REPLACE INTO cache '
+                '(key, value, size, expires, accessed) VALUES (?, ?, ?, ?, ?)',
+                rows)
+        self._maybe_cull(len(rows))
+        return []
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        with self._transaction() as db:
+            return bool(db.execute(
+                'UPDATE cache SET expires = ?, accessed = ? '
+                'WHERE key = ? AND (expires IS NULL OR expires > ?)',
+                (self._expires(timeout), time.time(), key, time.time())
+            ).rowcount)
+
+    def delete(self, key, version=None):
+        self.delete_many([key], version)
+
+    def delete_many(self, keys, version=None):
+        keys = [self._key(key, version) for key in keys]
+        with self._transaction() as db:
+            db.executemany('DELETE FROM cache WHERE key = ?',
+                           ((key,) for key in keys))
+
+    def has_key(self, key, version=None):
+        key = self._key(key, version)
+        return self._db.execute(
+            'SELECT 1 FROM cache WHERE key = ? '
+            'AND (expires IS NULL OR expires > ?)',
+            (key, time.time())).fetchone() is not None
+
+    def clear(self):
+        with self._transaction() as db:
+            db.execute('DELETE FROM cache')
+
+    def _maybe_cull(self, writes):
+        """Проверяет размер кэша раз в CULL_EVERY записей процесса."""
+        with self._lock:
+            self._writes += writes
+            if self._writes < self._cull_every:
+                return
+            self._writes = 0
+        self._cull()
+
+    def _cull(self):
+        with self._transaction() as db:
+            db.execute('DELETE FROM cache WHERE expires <= ?', (time.time(),))
+            count, size = db.execute(
+                'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache'
+            ).fetchone()
+            over_size = self._max_size and size > self._max_size
+            if count <= self._max_entries and not over_size:
+                return
+            if self._cull_frequency == 0:
+                db.execute('DELETE FROM cache')
+                return
+            db.execute(
+                'DELETE FROM cache WHERE key IN (SELECT key FROM cache '
+                'ORDER BY accessed LIMIT ?)',
+                (max(count // self._cull_frequency, 1),))
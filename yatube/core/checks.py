@@ -0,0 +1,84 @@
+"""Проверка, что в production не осталось отладочных компонентов
+и ключа из репозитория.
+
+Выполняется вместе с остальными проверками Django (manage.py check,
+runserver, migrate) и при старте WSGI-приложения: там предупреждения
+пишутся в журнал, а без своего SECRET_KEY приложение не запускается.
+"""
+import logging
+
+from django.conf import settings
+from django.core.checks import Error, Warning, register
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+DEBUG_APPS = ('debug_toolbar',)
+DEBUG_MIDDLEWARE = ('debug_toolbar.middleware.DebugToolbarMiddleware',)
+
+
+def _debug_mode():
+    if settings.DEBUG:
+        yield 'core.W001', ('DEBUG = True: подробные страницы ошибок и '
+                            'запись всех SQL-запросов в память')
+
+
+def _debug_toolbar():
+    for app in DEBUG_APPS:
+        if app in settings.INSTALLED_APPS:
+            yield 'core.W002', f'{app} в INSTALLED_APPS'
+    for middleware in DEBUG_MIDDLEWARE:
+        if middleware in settings.MIDDLEWARE:
+            yield 'core.W003', f'{middleware} в MIDDLEWARE'
+
+
+def _debug_cursors():
+    for connection in connections.all():
+        if connection.force_debug_cursor:
+            yield 'core.W004', ('запись SQL-запросов включена '
+                                f'для базы {connection.alias}')
+
+
+def _template_reloading():
+    if not settings.TEMPLATE_CACHE:
+        yield 'core.W005', ('TEMPLATE_CACHE выключен: шаблоны '
+                            'разбираются на каждый запрос')
+    if settings.TEMPLATE_WATCH:
+        yield 'core.W006', 'TEMPLATE_WATCH включён'
+
+
+DEBUG_COMPONENTS = (_debug_mode, _debug_toolbar, _debug_cursors,
+                    _template_reloading)
+
+
+@register('production')
+def debug_components(app_configs=None, **kwargs):
+    if not settings.PRODUCTION:
+        return []
+    return [Warning(f'Отладочный компонент в production: {message}', id=id)
+            for component in DEBUG_COMPONENTS
+            for id, message in component()]
+
+
+@register('production')
+def secret_key(app_configs=None, **kwargs):
+    if (settings.PRODUCTION
+            and settings.SECRET_KEY == settings.DEVELOPMENT_SECRET_KEY):
+        return [Error(
+            'В production используется SECRET_KEY из репозитория',
+            hint='Задайте SECRET_KEY в переменной окружения.',
+            id='core.E001')]
+    return []
+
+
+def report_debug_components():
+    """Пишет в журнал отладочные компоненты, оставшиеся в production."""
+    for warning in debug_components():
+        logger.warning('%s (%s)', warning.msg, warning.id)
+
+
+def require_secret_key():
+    """Не даёт запустить production с SECRET_KEY из репозитория."""
+    for error in secret_key():
+        raise ImproperlyConfigured(f'{error.msg} ({error.id}). {error.hint}')
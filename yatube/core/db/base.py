@@ -0,0 +1,30 @@
+"""SQLite с настройкой соединений для нескольких процессов и потоков.
+
+В OPTIONS, помимо параметров sqlite3.connect, понимает:
+
+* pragmas — PRAGMA, выполняемые на каждом новом соединении;
+* immediate_transactions — открывать atomic() через BEGIN IMMEDIATE.
+  Отложенная транзакция, начавшая писать после чтения, получает
+  "database is locked" сразу, минуя busy timeout; немедленная ждёт
+  блокировку записи в начале транзакции.
+"""
+from django.db.backends.sqlite3 import base
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    def get_connection_params(self):
+        kwargs = super().get_connection_params()
+        self.pragmas = kwargs.pop('pragmas', {})
+        self.immediate_transactions = kwargs.pop(
+            'immediate_transactions', False)
+        return kwargs
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        for name, value in self.pragmas.items():
+            conn.execute(f'PRAGMA {name} = {value}')
+        return conn
+
+    def _start_transaction_under_autocommit(self):
+        self.cursor().execute(
+            'BEGIN IMMEDIATE' if self.immediate_transactions else 'BEGIN')
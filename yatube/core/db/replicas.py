@@ -0,0 +1,80 @@
+"""Чтение с реплик базы для страниц, помеченных replica_reads.
+
+На реплики ходят только модели контента из REPLICA_APPS; пользователи,
+сессии, права и contenttypes всегда читаются с default. Запись и всё,
+что не помечено, тоже идёт в default. Если запрос что-то
+записал (роутер видит это в db_for_write), PinPrimaryMiddleware ставит
+cookie, и на REPLICA_PIN_SECONDS клиент читает с default: сразу после
+публикации поста автор видит его в профиле, даже если реплика отстаёт.
+"""
+import random
+import threading
+from contextlib import contextmanager
+from functools import wraps
+
+from django.conf import settings
+
+PIN_COOKIE = 'pin_primary'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+REPLICA_APPS = ('posts',)
+
+_state = threading.local()
+
+
+def reading_from_replica():
+    return bool(getattr(_state, 'replica', False)
+                and settings.DATABASE_REPLICAS)
+
+
+@contextmanager
+def read_from_replica():
+    previous = getattr(_state, 'replica', False)
+    _state.replica = True
+    try:
+        yield
+    finally:
+        _state.replica = previous
+
+
+def replica_reads(view):
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if (request.method not in SAFE_METHODS
+                or PIN_COOKIE in request.COOKIES):
+            return view(request, *args, **kwargs)
+        with read_from_replica():
+            return view(request, *args, **kwargs)
+    return wrapper
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if (reading_from_replica()
+                and model._meta.app_label in REPLICA_APPS
+                and model._meta.label != settings.AUTH_USER_MODEL):
+            return random.choice(settings.DATABASE_REPLICAS)
+        return None
+
+    def db_for_write(self, model, **hints):
+        _state.wrote = True
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db not in settings.DATABASE_REPLICAS
+
+
+class PinPrimaryMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        _state.wrote = False
+        response = self.get_response(request)
+        if _state.wrote and settings.DATABASE_REPLICAS:
+            response.set_cookie(
+                PIN_COOKIE, '1', max_age=settings.REPLICA_PIN_SECONDS,
+                httponly=True, samesite='Lax')
+        return response
@@ -0,0 +1,62 @@
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.profiling import dump_stats, load_stats
+
+COLUMNS = (
+    ('запросов', lambda stats: stats['requests'], 'd'),
+    ('всего, с', lambda stats: stats['time'], '.1f'),
+    ('среднее, мс', lambda stats: stats['time'] * 1000 / stats['requests'],
+     '.1f'),
+    ('макс., мс', lambda stats: stats['max_time'] * 1000, '.1f'),
+    ('SQL', lambda stats: stats['queries'] / stats['requests'], '.1f'),
+    ('SQL, мс', lambda stats: stats['sql_time'] * 1000 / stats['requests'],
+     '.1f'),
+    ('шаблоны, мс',
+     lambda stats: stats['template_time'] * 1000 / stats['requests'], '.1f'),
+    ('кэш, %', lambda stats: 100 * stats['cache_hits'] / (
+        stats['cache_hits'] + stats['cache_misses'] or 1), '.0f'),
+)
+SORT_KEYS = {
+    'time': 'time',
+    'max': 'max_time',
+    'queries': 'queries',
+    'sql': 'sql_time',
+    'templates': 'template_time',
+    'requests': 'requests',
+}
+
+
+class Command(BaseCommand):
+    help = ('Сводит статистику ProfilingMiddleware всех процессов: '
+            'средние значения на запрос по представлениям')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sort', choices=SORT_KEYS, default='time',
+                            help='по какой сумме сортировать')
+        parser.add_argument('--limit', type=int, default=20)
+        parser.add_argument('--reset', action='store_true',
+                            help='удалить накопленную статистику')
+
+    def handle(self, *args, **options):
+        if options['reset']:
+            directory = settings.PROFILING_STATS_DIR
+            if os.path.isdir(directory):
+                for name in os.listdir(directory):
+                    os.remove(os.path.join(directory, name))
+            self.stdout.write(self.style.SUCCESS('Статистика удалена'))
+            return
+        dump_stats()
+        stats = sorted(load_stats().items(), reverse=True,
+                       key=lambda item: item[1][SORT_KEYS[options['sort']]])
+        if not stats:
+            self.stdout.write('Статистики пока нет')
+            return
+        width = max(len(view) for view, _ in stats[:options['limit']])
+        self.stdout.write('представление'.ljust(width) + ''.join(
+            f'{title:>13}' for title, _, _ in COLUMNS))
+        for view, values in stats[:options['limit']]:
+            self.stdout.write(view.ljust(width) + ''.join(
+                f'{value(values):>13{spec}}' for _, value, spec in COLUMNS))
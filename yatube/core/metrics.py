@@ -0,0 +1,283 @@
+"""Метрики в текстовом формате Prometheus, общие для всех процессов.
+
+Процесс копит приращения в памяти и не реже раза в
+METRICS_FLUSH_INTERVAL секунд прибавляет их к суммам в файле SQLite
+METRICS_DB, как SQLiteCache делит кэш между воркерами. Страница
+/metrics/ отдаёт суммы из файла, то есть по всем процессам сразу.
+Гистограммы хранятся счётчиками по корзинам, поэтому тоже складываются.
+"""
+import atexit
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from bisect import bisect_left
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connections
+
+from .profiling import wrap_method
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS samples (
+    name TEXT NOT NULL,
+    labels TEXT NOT NULL,
+    value REAL NOT NULL,
+    PRIMARY KEY (name, labels)
+);
+'''
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.5)
+FRAGMENT_PREFIX = 'template.cache.'
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+REGISTRY = {}
+_lock = threading.Lock()
+_pending = {}
+_pending_pid = None
+_local = threading.local()
+_flushed = 0.0
+
+
+def _format(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+def _add(*increments):
+    """Копит пары ((имя, метки), приращение).
+
+    После fork потомок начинает с пустого буфера, чтобы не прибавить
+    к общим суммам ещё раз приращения родителя.
+    """
+    global _pending, _pending_pid
+    with _lock:
+        if _pending_pid != os.getpid():
+            _pending, _pending_pid = {}, os.getpid()
+        for key, value in increments:
+            _pending[key] = _pending.get(key, 0) + value
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        REGISTRY[name] = self
+
+    def inc(self, amount=1, **labels):
+        labels = tuple((label, str(labels[label])) for label in self.labels)
+        _add(((self.name, labels), amount))
+
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labels=(),
+                 buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.buckets = (*buckets, float('inf'))
+        self.bounds = tuple(map(_format, self.buckets))
+        REGISTRY[name] = self
+
+    def observe(self, value, **labels):
+        """Учитывает значение в его корзине; суммы корзин — при выводе."""
+        labels = tuple((label, str(labels[label])) for label in self.labels)
+        le = self.bounds[bisect_left(self.buckets, value)]
+        _add(((f'{self.name}_bucket', (*labels, ('le', le))), 1),
+             ((f'{self.name}_sum', labels), value),
+             ((f'{self.name}_count', labels), 1))
+
+
+def _db():
+    path = settings.METRICS_DB
+    if getattr(_local, 'key', None) != (os.getpid(), path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        db = sqlite3.connect(path, timeout=5, isolation_level=None)
+        db.execute('PRAGMA journal_mode=WAL')
+        db.execute('PRAGMA synchronous=NORMAL')
+        db.executescript(SCHEMA)
+        _local.db, _local.key = db, (os.getpid(), path)
+    return _local.db
+
+
+def flush():
+    """Прибавляет накопленные приращения к общим суммам."""
+    global _pending, _flushed
+    with _lock:
+        pending, _pending = _pending, {}
+        _flushed = time.monotonic()
+        if _pending_pid != os.getpid():
+            return
+    if not pending:
+        return
+    try:
+        db = _db()
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            db.executemany(
+                'INSERT INTO samples VALUES (?, ?, ?) '
+                'ON CONFLICT (name, labels) '
+                'DO UPDATE SET value = value + excluded.value',
+                ((name, json.dumps(labels), value)
+                 for (name, labels), value in pending.items()))
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+        db.execute('COMMIT')
+    except sqlite3.Error:
+        logger.exception('Не удалось сохранить метрики')
+        _add(*pending.items())
+
+
+atexit.register(flush)
+
+
+def maybe_flush():
+    if time.monotonic() - _flushed >= settings.METRICS_FLUSH_INTERVAL:
+        flush()
+
+
+def _escape(value):
+    return (value.replace('\\', r'\\').replace('"', r'\"')
+            .replace('\n', r'\n'))
+
+
+def _sample_line(name, labels, value):
+    if labels:
+        name += '{%s}' % ','.join(
+            f'{label}="{_escape(text)}"' for label, text in labels)
+    return f'{name} {_format(value)}'
+
+
+def _histogram_lines(metric, samples):
+    series = {}
+    for name, labels, value in samples:
+        key = json.dumps([pair for pair in labels if pair[0] != 'le'])
+        suffix = name[len(metric.name):]
+        if suffix == '_bucket':
+            series.setdefault(key, {}).setdefault('buckets', {})[
+                labels[-1][1]] = value
+        else:
+            series.setdefault(key, {})[suffix] = value
+    for key, values in sorted(series.items()):
+        labels = json.loads(key)
+        buckets = values.get('buckets', {})
+        total = 0
+        for le in metric.bounds:
+            total += buckets.get(le, 0)
+            yield _sample_line(f'{metric.name}_bucket',
+                               [*labels, ['le', le]], total)
+        yield _sample_line(f'{metric.name}_sum', labels,
+                           values.get('_sum', 0))
+        yield _sample_line(f'{metric.name}_count', labels,
+                           values.get('_count', 0))
+
+
+def render():
+    """Все метрики в текстовом формате Prometheus."""
+    flush()
+    rows = _db().execute(
+        'SELECT name, labels, value FROM samples ORDER BY name, labels')
+    samples = {}
+    for name, labels, value in rows:
+        family = name
+        for suffix in ('_bucket', '_sum', '_count'):
+            if name.endswith(suffix) and name[:-len(suffix)] in REGISTRY:
+                family = name[:-len(suffix)]
+        samples.setdefault(family, []).append(
+            (name, json.loads(labels), value))
+    lines = []
+    for name, metric in sorted(REGISTRY.items()):
+        lines.append(f'# HELP {name} {metric.documentation}')
+        lines.append(f'# TYPE {name} {metric.kind}')
+        if metric.kind == 'histogram':
+            lines.extend(_histogram_lines(metric, samples.get(name, ())))
+        else:
+            lines.extend(_sample_line(*sample)
+                         for sample in samples.get(name, ()))
+    return '\n'.join(lines) + '\n'
+
+
+REQUEST_SECONDS = Histogram(
+    'yatube_request_duration_seconds', 'Время ответа по представлениям.',
+    labels=('view',))
+RESPONSES = Counter(
+    'yatube_responses_total', 'Ответы по представлениям и кодам.',
+    labels=('view', 'status'))
+QUERIES = Counter(
+    'yatube_db_queries_total', 'SQL-запросы по представлениям.',
+    labels=('view',))
+QUERY_SECONDS = Histogram(
+    'yatube_db_query_duration_seconds', 'Время SQL-запросов.',
+    labels=('view',), buckets=QUERY_BUCKETS)
+FRAGMENT_CACHE = Counter(
+    'yatube_fragment_cache_requests_total',
+    'Чтения кэша фрагментов шаблонов по представлениям и фрагментам.',
+    labels=('view', 'fragment', 'result'))
+
+
+class RequestMetrics:
+    def __init__(self, request):
+        self.request = request
+        self.query_times = []
+        self.fragments = []
+
+    def execute(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.query_times.append(time.perf_counter() - started)
+
+    def wrap_get(self, get):
+        def wrapper(key, default=None, version=None):
+            value = get(key, default, version=version)
+            if key.startswith(FRAGMENT_PREFIX):
+                self.fragments.append(
+                    (key.split('.')[2], value is not default))
+            return value
+        return wrapper
+
+    def record(self, response, elapsed):
+        match = getattr(self.request, 'resolver_match', None)
+        view = match.view_name if match else 'unresolved'
+        REQUEST_SECONDS.observe(elapsed, view=view)
+        RESPONSES.inc(view=view, status=response.status_code)
+        if self.query_times:
+            QUERIES.inc(len(self.query_times), view=view)
+        for duration in self.query_times:
+            QUERY_SECONDS.observe(duration, view=view)
+        for fragment, hit in self.fragments:
+            FRAGMENT_CACHE.inc(view=view, fragment=fragment,
+                               result='hit' if hit else 'miss')
+
+
+class MetricsMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        metrics = RequestMetrics(request)
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(
+                    connection.execute_wrapper(metrics.execute))
+            for alias in settings.CACHES:
+                wrap_method(stack, caches[alias], 'get', metrics.wrap_get)
+            response = self.get_response(request)
+        metrics.record(response, time.perf_counter() - started)
+        maybe_flush()
+        return response
@@ -0,0 +1,249 @@
+"""Профилирование запросов без debug toolbar.
+
+ProfilingMiddleware замеряет долю PROFILING_SAMPLE_RATE запросов: время
+ответа, число и время SQL-запросов, время рендеринга шаблонов и
+попадания в кэш. Итоги копятся по имени представления и не реже раза
+в PROFILING_DUMP_INTERVAL секунд сохраняются в PROFILING_STATS_DIR,
+по файлу на процесс; команда profiling_stats сводит их в таблицу.
+SQL-запросы дольше PROFILING_SLOW_QUERY_MS пишутся в лог с именем
+представления.
+"""
+import atexit
+import json
+import logging
+import os
+import random
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.template.backends.django import DjangoTemplates, Template
+
+logger = logging.getLogger(__name__)
+
+COUNTERS = ('requests', 'time', 'queries', 'sql_time', 'template_time',
+            'cache_hits', 'cache_misses')
+MISSING = object()
+
+_state = threading.local()
+_lock = threading.Lock()
+_stats = {}
+_stats_pid = None
+_dumped = 0.0
+
+
+def wrap_method(stack, obj, name, wrap):
+    """Подменяет метод объекта обёрткой до закрытия ExitStack stack."""
+    previous = vars(obj).get(name, MISSING)
+    setattr(obj, name, wrap(getattr(obj, name)))
+    if previous is MISSING:
+        stack.callback(vars(obj).pop, name)
+    else:
+        stack.callback(setattr, obj, name, previous)
+
+
+class RequestProfile:
+    def __init__(self, request):
+        self.request = request
+        self.time = 0.0
+        self.queries = 0
+        self.sql_time = 0.0
+        self.template_time = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.rendering = False
+        self.cache_depth = 0
+
+    @property
+    def view_name(self):
+        match = getattr(self.request, 'resolver_match', None)
+        return match.view_name if match else 'unresolved'
+
+    def execute(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.queries += 1
+            self.sql_time += elapsed
+            if elapsed * 1000 >= settings.PROFILING_SLOW_QUERY_MS:
+                logger.warning('Медленный запрос в %s: %.1f мс, %s',
+                               self.view_name, elapsed * 1000, sql)
+
+    def wrap_get(self, get):
+        def wrapper(key, default=None, version=None):
+            self.cache_depth += 1
+            try:
+                value = get(key, MISSING, version=version)
+            finally:
+                self.cache_depth -= 1
+            if not self.cache_depth:
+                if value is MISSING:
+                    self.cache_misses += 1
+                else:
+                    self.cache_hits += 1
+            return default if value is MISSING else value
+        return wrapper
+
+    def wrap_get_many(self, get_many):
+        def wrapper(keys, version=None):
+            keys = list(keys)
+            self.cache_depth += 1
+            try:
+                found = get_many(keys, version=version)
+            finally:
+                self.cache_depth -= 1
+            if not self.cache_depth:
+                self.cache_hits += len(found)
+                self.cache_misses += len(keys) - len(found)
+            return found
+        return wrapper
+
+    @contextmanager
+    def activate(self):
+        """Включает замеры в текущем потоке на время запроса.
+
+        Обёртки ставятся на объекты соединений и кэшей этого потока,
+        поэтому другие потоки их не видят.
+        """
+        _state.profile = self
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(
+                        connection.execute_wrapper(self.execute))
+                for alias in settings.CACHES:
+                    wrap_method(stack, caches[alias], 'get', self.wrap_get)
+                    wrap_method(stack, caches[alias], 'get_many',
+                                self.wrap_get_many)
+                yield self
+        finally:
+            _state.profile = None
+
+
+def current_profile():
+    return getattr(_state, 'profile', None)
+
+
+class ProfiledTemplate(Template):
+    def render(self, context=None, request=None):
+        profile = current_profile()
+        if profile is None or profile.rendering:
+            return super().render(context, request)
+        profile.rendering = True
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            profile.template_time += time.perf_counter() - started
+            profile.rendering = False
+
+
+class ProfiledTemplates(DjangoTemplates):
+    """Шаблоны Django, время рендеринга которых видит профилировщик."""
+
+    def from_string(self, template_code):
+        return ProfiledTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        return ProfiledTemplate(
+            super().get_template(template_name).template, self)
+
+
+def _process_stats():
+    """Итоги текущего процесса; после fork потомок начинает с нуля."""
+    global _stats, _stats_pid
+    if _stats_pid != os.getpid():
+        _stats, _stats_pid = {}, os.getpid()
+    return _stats
+
+
+def record(profile):
+    with _lock:
+        stats = _process_stats().setdefault(
+            profile.view_name, {**dict.fromkeys(COUNTERS, 0), 'max_time': 0})
+        stats['requests'] += 1
+        for counter in COUNTERS[1:]:
+            stats[counter] += getattr(profile, counter)
+        stats['max_time'] = max(stats['max_time'], profile.time)
+
+
+def snapshot():
+    with _lock:
+        return {view: dict(stats)
+                for view, stats in _process_stats().items()}
+
+
+def reset_stats():
+    with _lock:
+        _process_stats().clear()
+
+
+def merge(*snapshots):
+    """Сводит итоги нескольких процессов в один словарь."""
+    merged = {}
+    for stats in snapshots:
+        for view, values in stats.items():
+            total = merged.setdefault(
+                view, {**dict.fromkeys(COUNTERS, 0), 'max_time': 0})
+            for counter in COUNTERS:
+                total[counter] += values.get(counter, 0)
+            total['max_time'] = max(total['max_time'],
+                                    values.get('max_time', 0))
+    return merged
+
+
+def dump_stats():
+    """Сохраняет итоги процесса в PROFILING_STATS_DIR/<pid>.json."""
+    global _dumped
+    _dumped = time.monotonic()
+    stats = snapshot()
+    if not stats:
+        return
+    directory = settings.PROFILING_STATS_DIR
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f'{os.getpid()}.json')
+    with open(f'{path}.tmp', 'w') as file:
+        json.dump(stats, file)
+    os.replace(f'{path}.tmp', path)
+
+
+atexit.register(dump_stats)
+
+
+def load_stats():
+    """Итоги всех процессов из PROFILING_STATS_DIR."""
+    directory = settings.PROFILING_STATS_DIR
+    if not os.path.isdir(directory):
+        return {}
+    snapshots = []
+    for name in os.listdir(directory):
+        if name.endswith('.json'):
+            with open(os.path.join(directory, name)) as file:
+                snapshots.append(json.load(file))
+    return merge(*snapshots)
+
+
+class ProfilingMiddleware:
+    def __init__(self, get_response):
+        if not settings.PROFILING_SAMPLE_RATE:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if random.random() >= settings.PROFILING_SAMPLE_RATE:
+            return self.get_response(request)
+        profile = RequestProfile(request)
+        started = time.perf_counter()
+        with profile.activate():
+            response = self.get_response(request)
+        profile.time = time.perf_counter() - started
+        record(profile)
+        if time.monotonic() - _dumped >= settings.PROFILING_DUMP_INTERVAL:
+            dump_stats()
+        return response
@@ -0,0 +1,223 @@
+"""Статика с хешами в именах и её раздача из процесса WSGI.
+
+CompressedManifestStaticFilesStorage при collectstatic добавляет к именам
+файлов хеш содержимого и рядом с текстовыми файлами кладёт сжатые копии
+.gz (и .br, если установлен brotli). StaticFilesApplication отдаёт файлы
+STATIC_ROOT и MEDIA_ROOT без Django: файлы STATIC_ROOT с хешем в имени
+и миниатюры sorl-thumbnail кэшируются браузером навсегда, остальные
+перепроверяются по ETag; поддерживаются If-None-Match, If-Modified-Since
+и Range.
+"""
+import gzip
+import mimetypes
+import os
+import re
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.base import ContentFile
+from django.core.handlers.wsgi import get_path_info
+from django.utils.http import http_date, parse_http_date_safe
+from sorl.thumbnail.conf import settings as sorl_settings
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE = ('.css', '.js', '.svg', '.ico', '.json', '.map', '.txt',
+                '.xml', '.html')
+# Расширение сжатой копии, Content-Encoding и функция сжатия; по порядку
+# предпочтения.
+COMPRESSORS = [('.gz', 'gzip', lambda data: gzip.compress(data, 9, mtime=0))]
+if brotli is not None:
+    COMPRESSORS.insert(0, ('.br', 'br', brotli.compress))
+HASHED_NAME = re.compile(r'\.[0-9a-f]{12}\.[^./]+$')
+IMMUTABLE = 'public, max-age=31536000, immutable'
+RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+CHUNK_SIZE = 64 * 1024
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    def post_process(self, paths, dry_run=False, **options):
+        hashed = {}
+        for name, hashed_name, processed in super().post_process(
+                paths, dry_run, **options):
+            if hashed_name and not isinstance(processed, Exception):
+                hashed[name] = hashed_name
+            yield name, hashed_name, processed
+        if not dry_run:
+            for hashed_name in hashed.values():
+                self.compress(hashed_name)
+
+    def compress(self, name):
+        """Кладёт рядом с файлом сжатые копии, если они заметно меньше."""
+        if not name.endswith(COMPRESSIBLE):
+            return
+        with self.open(name) as file:
+            content = file.read()
+        for suffix, _, compress in COMPRESSORS:
+            data = compress(content)
+            if len(data) >= len(content) * 0.95:
+                continue
+            if self.exists(name + suffix):
+                self.delete(name + suffix)
+            self._save(name + suffix, ContentFile(data))
+
+
+def _accepted_encodings(environ):
+    accepted = set()
+    for item in environ.get('HTTP_ACCEPT_ENCODING', '').split(','):
+        coding, _, params = item.strip().partition(';')
+        if params.replace(' ', '') not in ('q=0', 'q=0.0', 'q=0.00'):
+            accepted.add(coding.strip().lower())
+    return accepted
+
+
+def _content_type(path):
+    content_type, _ = mimetypes.guess_type(path)
+    content_type = content_type or 'application/octet-stream'
+    if content_type.startswith('text/') or content_type.endswith(
+            ('javascript', 'json', 'xml')):
+        content_type += '; charset=utf-8'
+    return content_type
+
+
+def _select_encoding(environ, path):
+    """Путь к сжатой копии, которую принимает клиент, и её кодировка."""
+    accepted = _accepted_encodings(environ)
+    for suffix, coding, _ in COMPRESSORS:
+        if coding in accepted and os.path.isfile(path + suffix):
+            return path + suffix, coding
+    return path, None
+
+
+def _etag_matches(header, etag):
+    if header.strip() == '*':
+        return True
+    tags = (tag.strip() for tag in header.split(','))
+    return etag in (tag[2:] if tag.startswith('W/') else tag for tag in tags)
+
+
+def _not_modified(environ, etag, mtime):
+    if_none_match = environ.get('HTTP_IF_NONE_MATCH')
+    if if_none_match is not None:
+        return _etag_matches(if_none_match, etag)
+    since = parse_http_date_safe(environ.get('HTTP_IF_MODIFIED_SINCE', ''))
+    return since is not None and int(mtime) <= since
+
+
+def _requested_range(environ, etag, size):
+    """(start, end) из Range; None — весь файл, ValueError — 416."""
+    match = RANGE.match(environ.get('HTTP_RANGE', ''))
+    if (not match or not any(match.groups())
+            or environ.get('HTTP_IF_RANGE') not in (None, etag)):
+        return None
+    first, last = match.groups()
+    if first:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    else:
+        start, end = max(size - int(last), 0), size - 1
+    if start > end or start >= size:
+        raise ValueError
+    return start, end
+
+
+def _read(file, start, length):
+    try:
+        file.seek(start)
+        while length > 0:
+            chunk = file.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+    finally:
+        file.close()
+
+
+class StaticFilesApplication:
+    """WSGI-обёртка, отдающая STATIC_URL и MEDIA_URL из файловой системы."""
+
+    def __init__(self, application):
+        self.application = application
+        self.roots = [
+            (url, os.path.realpath(root), hashed, immutable)
+            for url, root, hashed, immutable in (
+                (settings.STATIC_URL, settings.STATIC_ROOT, True, None),
+                (settings.MEDIA_URL, settings.MEDIA_ROOT, False,
+                 sorl_settings.THUMBNAIL_PREFIX))
+            if url and url.startswith('/') and root]
+
+    def __call__(self, environ, start_response):
+        path = get_path_info(environ)
+        for url, root, hashed, immutable in self.roots:
+            if path.startswith(url):
+                name = path[len(url):]
+                cache_control = self.cache_control(name, hashed, immutable)
+                return self.serve(environ, start_response, root, name,
+                                  cache_control)
+        return self.application(environ, start_response)
+
+    def cache_control(self, name, hashed, immutable_prefix):
+        if (hashed and HASHED_NAME.search(name)) or (
+                immutable_prefix and name.startswith(immutable_prefix)):
+            return IMMUTABLE
+        return f'public, max-age={settings.STATIC_MAX_AGE}'
+
+    def serve(self, environ, start_response, root, name, cache_control):
+        method = environ['REQUEST_METHOD']
+        if method not in ('GET', 'HEAD'):
+            start_response('405 Method Not Allowed', [
+                ('Allow', 'GET, HEAD'), ('Content-Length', '0')])
+            return []
+        path = os.path.realpath(os.path.join(root, name))
+        if not path.startswith(root + os.sep) or not os.path.isfile(path):
+            start_response('404 Not Found', [
+                ('Content-Type', 'text/plain; charset=utf-8'),
+                ('Content-Length', '9')])
+            return [b'Not Found']
+
+        headers = [('Content-Type', _content_type(path)),
+                   ('Cache-Control', cache_control),
+                   ('Accept-Ranges', 'bytes')]
+        if path.endswith(COMPRESSIBLE):
+            headers.append(('Vary', 'Accept-Encoding'))
+            path, coding = _select_encoding(environ, path)
+            if coding:
+                headers.append(('Content-Encoding', coding))
+        stat = os.stat(path)
+        etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+        headers += [('ETag', etag),
+                    ('Last-Modified', http_date(stat.st_mtime))]
+        if _not_modified(environ, etag, stat.st_mtime):
+            start_response('304 Not Modified', [
+                header for header in headers
+                if header[0] not in ('Content-Type', 'Content-Encoding')])
+            return []
+        return self.respond(environ, start_response, path, headers, etag,
+                            stat.st_size)
+
+    def respond(self, environ, start_response, path, headers, etag, size):
+        """Отдаёт файл целиком или диапазон из заголовка Range."""
+        try:
+            requested = _requested_range(environ, etag, size)
+        except ValueError:
+            start_response('416 Range Not Satisfiable', [
+                ('Content-Range', f'bytes */{size}'),
+                ('Content-Length', '0')])
+            return []
+        start, length, status = 0, size, '200 OK'
+        if requested:
+            start, end = requested
+            length, status = end - start + 1, '206 Partial Content'
+            headers.append(('Content-Range', f'bytes {start}-{end}/{size}'))
+        headers.append(('Content-Length', str(length)))
+        start_response(status, headers)
+        if environ['REQUEST_METHOD'] == 'HEAD':
+            return []
+        file = open(path, 'rb')
+        if length == size and 'wsgi.file_wrapper' in environ:
+            return environ['wsgi.file_wrapper'](file, CHUNK_SIZE)
+        return _read(file, start, length)
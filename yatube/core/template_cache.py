@@ -0,0 +1,97 @@
+"""Предкомпиляция шаблонов и сброс их кэша при изменении файлов.
+
+При TEMPLATE_CACHE шаблоны грузит django.template.loaders.cached: каждый
+файл читается и разбирается один раз на процесс. warm_up() при старте
+воркера компилирует все шаблоны из DIRS, чтобы первые запросы не платили
+за разбор. При TEMPLATE_WATCH фоновый поток следит за файлами шаблонов
+и сбрасывает кэш, когда они меняются, — для разработки с кэшем.
+"""
+import logging
+import os
+import threading
+import time
+
+from django.conf import settings
+from django.template import TemplateSyntaxError, engines
+from django.template.backends.django import DjangoTemplates
+
+logger = logging.getLogger(__name__)
+
+_watcher = None
+
+
+def _django_engines():
+    return [backend.engine for backend in engines.all()
+            if isinstance(backend, DjangoTemplates)]
+
+
+def template_files(engine):
+    """Пары (имя шаблона, путь) для всех файлов из DIRS шаблонизатора."""
+    for directory in engine.dirs:
+        for root, _, files in os.walk(directory):
+            for file in files:
+                if file.endswith(('.html', '.txt')):
+                    path = os.path.join(root, file)
+                    name = os.path.relpath(path, directory)
+                    yield name.replace(os.sep, '/'), path
+
+
+def warm_up():
+    """Компилирует все шаблоны и возвращает их число.
+
+    Без кэширующего загрузчика ничего не делает: компилировать
+    шаблоны заранее было бы не во что.
+    """
+    if not settings.TEMPLATE_CACHE:
+        return 0
+    compiled = 0
+    for engine in _django_engines():
+        for name, _ in template_files(engine):
+            try:
+                engine.get_template(name)
+            except TemplateSyntaxError:
+                logger.exception('Шаблон %s не компилируется', name)
+            else:
+                compiled += 1
+    return compiled
+
+
+def reset():
+    """Сбрасывает кэш скомпилированных шаблонов."""
+    for engine in _django_engines():
+        for loader in engine.template_loaders:
+            if hasattr(loader, 'reset'):
+                loader.reset()
+
+
+def _snapshot():
+    mtimes = {}
+    for engine in _django_engines():
+        for _, path in template_files(engine):
+            try:
+                mtimes[path] = os.stat(path).st_mtime_ns
+            except OSError:
+                pass
+    return mtimes
+
+
+def _watch(interval):
+    mtimes = _snapshot()
+    while True:
+        time.sleep(interval)
+        current = _snapshot()
+        if current != mtimes:
+            logger.info('Шаблоны изменились, кэш шаблонов сброшен')
+            reset()
+            mtimes = current
+
+
+def start_watcher(interval=1):
+    """Запускает поток, сбрасывающий кэш при изменении шаблонов."""
+    global _watcher
+    if not (settings.TEMPLATE_CACHE and settings.TEMPLATE_WATCH):
+        return
+    if _watcher is None or not _watcher.is_alive():
+        _watcher = threading.Thread(target=_watch, args=(interval,),
+                                    name='template-watcher', daemon=True)
+        _watcher.start()
@@ -0,0 +1,514 @@
+import gzip
+import multiprocessing
+import os
+import shutil
+import sqlite3
+import tempfile
+from io import StringIO
+from wsgiref.util import setup_testing_defaults
+
+from django.conf import settings
+from django.contrib.auth.models import Permission
+from django.contrib.contenttypes.models import ContentType
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.db import connection
+from django.http import HttpResponse
+from django.test import (RequestFactory, SimpleTestCase, TestCase,
+                         override_settings)
+from django.urls import reverse
+
+from posts.models import Post, User
+
+from .cache import SQLiteCache
+from .checks import debug_components, require_secret_key, secret_key
+from .db.base import DatabaseWrapper
+from .metrics import REQUEST_SECONDS, flush
+from .db.replicas import (PIN_COOKIE, ReplicaRouter, read_from_replica,
+                          reading_from_replica, replica_reads)
+from .profiling import load_stats, reset_stats, snapshot
+from .static import (IMMUTABLE, CompressedManifestStaticFilesStorage,
+                     StaticFilesApplication)
+from .template_cache import _django_engines, reset, warm_up
+
+
+class SQLiteCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.location = os.path.join(self.directory, 'cache.sqlite3')
+        self.cache = self.make_cache()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def make_cache(self, **options):
+        return SQLiteCache(self.location, {'OPTIONS': options})
+
+    def test_set_get_delete(self):
+        """Значения сохраняются, читаются и удаляются"""
+        self.cache.set('key', {'value': 1})
+        self.assertEqual(self.cache.get('key'), {'value': 1})
+        self.assertEqual(self.cache.get_many(['key', 'missing']),
+                         {'key': {'value': 1}})
+        self.cache.delete('key')
+        self.assertIsNone(self.cache.get('key'))
+
+    def test_cache_is_shared_between_instances(self):
+        """Разные экземпляры (процессы) видят одни и те же записи"""
+        self.cache.set('shared', 'page')
+        self.assertEqual(self.make_cache().get('shared'), 'page')
+
+    def test_expired_values_are_missing(self):
+        """Просроченные значения не отдаются и могут быть добавлены заново"""
+        self.cache.set('key', 'value', timeout=0)
+        self.assertIsNone(self.cache.get('key'))
+        self.assertTrue(self.cache.add('key', 'new'))
+        self.assertFalse(self.cache.add('key', 'other'))
+        self.assertEqual(self.cache.get('key'), 'new')
+
+    def test_least_recently_used_entries_are_evicted(self):
+        """При превышении MAX_ENTRIES вытесняются давно не читанные записи"""
+        cache = self.make_cache(MAX_ENTRIES=3, CULL_FREQUENCY=4,
+                                CULL_EVERY=1, ACCESS_RESOLUTION=0)
+        for number in range(4):
+            cache.set(f'key_{number}', number)
+            cache.get('key_0')
+        self.assertEqual(cache.get('key_0'), 0)
+        self.assertIsNone(cache.get('key_1'))
+
+    def test_max_size_limits_stored_bytes(self):
+        """Суммарный размер значений ограничен MAX_SIZE"""
+        cache = self.make_cache(MAX_SIZE=3000, CULL_FREQUENCY=2,
+                                CULL_EVERY=1)
+        for number in range(10):
+            cache.set(f'key_{number}', 'x' * 1000)
+        size = cache._db.execute('SELECT SUM(size) FROM cache').fetchone()[0]
+        self.assertLessEqual(size, 3000 + 1100)
+        self.assertIsNotNone(cache.get('key_9'))
+
+    def test_reads_do_not_write_within_access_resolution(self):
+        """Чтение свежей записи не пишет в файл"""
+        self.cache.set('key', 'value')
+        changes = self.cache._db.total_changes
+        for _ in range(3):
+            self.assertEqual(self.cache.get('key'), 'value')
+        self.assertEqual(self.cache._db.total_changes, changes)
+
+    def test_size_is_checked_every_cull_every_writes(self):
+        """Лишние записи вытесняются не на каждой записи, а раз в CULL_EVERY"""
+        cache = self.make_cache(MAX_ENTRIES=2, CULL_FREQUENCY=0, CULL_EVERY=5)
+        cache.set_many({f'key_{number}': number for number in range(4)})
+        self.assertEqual(cache.get('key_3'), 3)
+        cache.set('key_4', 4)
+        self.assertIsNone(cache.get('key_3'))
+
+    def test_clear_and_incr(self):
+        """incr и clear работают поверх базовой реализации"""
+        self.cache.set('counter', 1)
+        self.assertEqual(self.cache.incr('counter'), 2)
+        self.cache.clear()
+        self.assertFalse(self.cache.has_key('counter'))
+
+
+class SQLiteBackendTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'db.sqlite3')
+        self.database = DatabaseWrapper(
+            {**connection.settings_dict, 'NAME': self.path})
+
+    def tearDown(self):
+        self.database.close()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_pragmas_are_applied_on_connect(self):
+        """Новое соединение получает PRAGMA из OPTIONS"""
+        pragmas = {'journal_mode': 'wal', 'synchronous': 1,
+                   'cache_size': -64 * 1024, 'busy_timeout': 20 * 1000}
+        with self.database.cursor() as cursor:
+            for name, value in pragmas.items():
+                with self.subTest(pragma=name):
+                    cursor.execute(f'PRAGMA {name}')
+                    self.assertEqual(cursor.fetchone()[0], value)
+
+    def test_transactions_take_write_lock_immediately(self):
+        """atomic() сразу занимает блокировку записи"""
+        self.database.ensure_connection()
+        self.database._start_transaction_under_autocommit()
+        other = sqlite3.connect(self.path, timeout=0)
+        try:
+            with self.assertRaisesMessage(sqlite3.OperationalError,
+                                          'database is locked'):
+                other.execute('BEGIN IMMEDIATE')
+        finally:
+            other.close()
+            self.database.connection.rollback()
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReplicaRoutingTests(TestCase):
+    def test_router_reads_from_replica_only_when_asked(self):
+        """Чтение идёт на реплику только внутри read_from_replica"""
+        router = ReplicaRouter()
+        self.assertIsNone(router.db_for_read(Post))
+        with read_from_replica():
+            self.assertEqual(router.db_for_read(Post), 'replica')
+            self.assertEqual(router.db_for_write(Post), 'default')
+        self.assertIsNone(router.db_for_read(Post))
+
+    def test_router_keeps_users_and_sessions_on_default(self):
+        """Пользователи, сессии и contenttypes читаются с default"""
+        router = ReplicaRouter()
+        with read_from_replica():
+            for model in (User, Session, ContentType, Permission):
+                with self.subTest(model=model.__name__):
+                    self.assertIsNone(router.db_for_read(model))
+
+    def test_replica_reads_skips_writes_and_pinned_clients(self):
+        """Небезопасные запросы и клиенты с cookie читают с default"""
+        @replica_reads
+        def view(request):
+            return HttpResponse(str(reading_from_replica()))
+
+        factory = RequestFactory()
+        pinned = factory.get('/')
+        pinned.COOKIES[PIN_COOKIE] = '1'
+        requests = (
+            (factory.get('/'), b'True'),
+            (factory.post('/'), b'False'),
+            (pinned, b'False'),
+        )
+        for request, expected in requests:
+            with self.subTest(method=request.method):
+                self.assertEqual(view(request).content, expected)
+
+    def test_writes_pin_client_to_primary(self):
+        """После записи, даже по GET, клиент читает с default"""
+        author = User.objects.create_user(username='author')
+        reader = User.objects.create_user(username='reader')
+        self.client.force_login(reader)
+        response = self.client.get(
+            reverse('posts:profile_follow', args=(author.username,)))
+        self.assertIn(PIN_COOKIE, response.cookies)
+        response = self.client.get(reverse('about:author'))
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+
+
+class CompressedManifestStorageTests(SimpleTestCase):
+    def test_collected_files_are_hashed_and_compressed(self):
+        """Файлы получают хеш в имени, текстовые — сжатые копии"""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        storage = CompressedManifestStaticFilesStorage(location=directory)
+        storage.save('css/site.css', ContentFile(b'body { margin: 0; }' * 50))
+        storage.save('img/logo.png', ContentFile(b'\x89PNG' * 50))
+        list(storage.post_process({
+            name: (storage, name) for name in ('css/site.css',
+                                               'img/logo.png')}))
+        css = storage.stored_name('css/site.css')
+        self.assertRegex(css, r'^css/site\.[0-9a-f]{12}\.css$')
+        with storage.open(css + '.gz') as file:
+            self.assertEqual(gzip.decompress(file.read()),
+                             b'body { margin: 0; }' * 50)
+        self.assertFalse(storage.exists(
+            storage.stored_name('img/logo.png') + '.gz'))
+
+
+class StaticFilesApplicationTests(SimpleTestCase):
+    def setUp(self):
+        self.static_root = tempfile.mkdtemp()
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.static_root)
+        self.addCleanup(shutil.rmtree, self.media_root)
+        files = {
+            (self.static_root, 'css/site.0123456789ab.css'): b'a' * 100,
+            (self.static_root, 'css/site.0123456789ab.css.gz'): b'gz',
+            (self.static_root, 'robots.txt'): b'User-agent: *',
+            (self.media_root, 'cache/ab/cd/thumb.jpg'): b'jpeg',
+            (self.media_root, 'posts/photo.jpg'): b'photo',
+            (self.media_root, 'posts/photo.0123456789ab.jpg'): b'photo',
+        }
+        for (root, name), content in files.items():
+            os.makedirs(os.path.dirname(os.path.join(root, name)),
+                        exist_ok=True)
+            with open(os.path.join(root, name), 'wb') as file:
+                file.write(content)
+        roots = override_settings(STATIC_ROOT=self.static_root,
+                                  MEDIA_ROOT=self.media_root)
+        roots.enable()
+        self.addCleanup(roots.disable)
+        self.application = StaticFilesApplication(
+            lambda environ, start_response: ['django'])
+
+    def get(self, path, method='GET', **headers):
+        environ = {'PATH_INFO': path, 'REQUEST_METHOD': method, **headers}
+        setup_testing_defaults(environ)
+        response = {}
+
+        def start_response(status, headers):
+            response['status'] = int(status.split()[0])
+            response['headers'] = dict(headers)
+
+        body = self.application(environ, start_response)
+        if body == ['django']:
+            return None, {}, b''
+        content = b''.join(body)
+        if hasattr(body, 'close'):
+            body.close()
+        return response['status'], response['headers'], content
+
+    def test_hashed_static_and_thumbnails_are_immutable(self):
+        """Файлы с хешем и миниатюры кэшируются навсегда, прочие нет"""
+        cases = {
+            '/static/css/site.0123456789ab.css': IMMUTABLE,
+            '/media/cache/ab/cd/thumb.jpg': IMMUTABLE,
+            '/static/robots.txt': 'public, max-age=3600',
+            '/media/posts/photo.jpg': 'public, max-age=3600',
+            '/media/posts/photo.0123456789ab.jpg': 'public, max-age=3600',
+        }
+        for path, cache_control in cases.items():
+            with self.subTest(path=path):
+                status, headers, _ = self.get(path)
+                self.assertEqual(status, 200)
+                self.assertEqual(headers['Cache-Control'], cache_control)
+                self.assertIn('ETag', headers)
+
+    def test_compressed_copy_is_served_when_accepted(self):
+        """Сжатая копия отдаётся клиенту, который её принимает"""
+        path = '/static/css/site.0123456789ab.css'
+        status, headers, content = self.get(
+            path, HTTP_ACCEPT_ENCODING='br;q=0, gzip')
+        self.assertEqual(content, b'gz')
+        self.assertEqual(headers['Content-Encoding'], 'gzip')
+        self.assertEqual(headers['Vary'], 'Accept-Encoding')
+        self.assertEqual(headers['Content-Type'], 'text/css; charset=utf-8')
+        _, headers, content = self.get(path)
+        self.assertEqual(content, b'a' * 100)
+        self.assertNotIn('Content-Encoding', headers)
+
+    def test_conditional_requests_return_not_modified(self):
+        """Совпавший ETag или дата дают 304 без тела"""
+        _, headers, _ = self.get('/media/posts/photo.jpg')
+        status, _, content = self.get(
+            '/media/posts/photo.jpg', HTTP_IF_NONE_MATCH=headers['ETag'])
+        self.assertEqual((status, content), (304, b''))
+        status, _, _ = self.get(
+            '/media/posts/photo.jpg',
+            HTTP_IF_MODIFIED_SINCE=headers['Last-Modified'])
+        self.assertEqual(status, 304)
+        status, _, _ = self.get('/media/posts/photo.jpg',
+                                HTTP_IF_NONE_MATCH='"other"')
+        self.assertEqual(status, 200)
+
+    def test_ranges(self):
+        """Запрос части файла отдаёт 206, недостижимый диапазон — 416"""
+        path = '/static/robots.txt'
+        status, headers, content = self.get(path, HTTP_RANGE='bytes=5-9')
+        self.assertEqual((status, content), (206, b'agent'))
+        self.assertEqual(headers['Content-Range'], 'bytes 5-9/13')
+        status, _, content = self.get(path, HTTP_RANGE='bytes=-1')
+        self.assertEqual((status, content), (206, b'*'))
+        status, headers, _ = self.get(path, HTTP_RANGE='bytes=20-')
+        self.assertEqual(status, 416)
+        self.assertEqual(headers['Content-Range'], 'bytes */13')
+
+    def test_other_paths_and_missing_files(self):
+        """Чужие адреса идут в Django, выход за каталог и POST — нет"""
+        self.assertIsNone(self.get('/posts/1/')[0])
+        self.assertEqual(self.get('/static/missing.css')[0], 404)
+        self.assertEqual(self.get('/media/../../etc/passwd')[0], 404)
+        self.assertEqual(self.get('/static/robots.txt', 'POST')[0], 405)
+        status, headers, content = self.get('/static/robots.txt', 'HEAD')
+        self.assertEqual((status, content), (200, b''))
+        self.assertEqual(headers['Content-Length'], '13')
+
+
+class DebugComponentsCheckTests(SimpleTestCase):
+    @override_settings(PRODUCTION=True, DEBUG=True, TEMPLATE_CACHE=False,
+                       TEMPLATE_WATCH=True)
+    def test_debug_components_are_reported_in_production(self):
+        """В production сообщается о каждом отладочном компоненте"""
+        with self.modify_settings(
+                INSTALLED_APPS={'append': 'debug_toolbar'},
+                MIDDLEWARE={'append': 'debug_toolbar.middleware.'
+                                      'DebugToolbarMiddleware'}):
+            ids = [warning.id for warning in debug_components()]
+        self.assertEqual(ids, ['core.W001', 'core.W002', 'core.W003',
+                               'core.W005', 'core.W006'])
+
+    @override_settings(PRODUCTION=True, DEBUG=False, TEMPLATE_CACHE=True,
+                       TEMPLATE_WATCH=False)
+    def test_clean_production_settings_pass(self):
+        """Без отладочных компонентов предупреждений нет"""
+        with self.modify_settings(INSTALLED_APPS={'remove': 'debug_toolbar'},
+                                  MIDDLEWARE={'remove': 'debug_toolbar.'
+                                              'middleware.'
+                                              'DebugToolbarMiddleware'}):
+            self.assertEqual(debug_components(), [])
+
+    def test_development_is_not_checked(self):
+        """Вне production проверка ничего не сообщает"""
+        self.assertEqual(debug_components(), [])
+        self.assertEqual(secret_key(), [])
+
+    @override_settings(PRODUCTION=True,
+                       SECRET_KEY=settings.DEVELOPMENT_SECRET_KEY)
+    def test_production_requires_own_secret_key(self):
+        """production с ключом из репозитория не запускается"""
+        self.assertEqual([error.id for error in secret_key()], ['core.E001'])
+        with self.assertRaisesMessage(ImproperlyConfigured, 'core.E001'):
+            require_secret_key()
+        with override_settings(SECRET_KEY='production-key'):
+            self.assertEqual(secret_key(), [])
+            require_secret_key()
+
+
+CACHED_TEMPLATES = [{
+    **settings.TEMPLATES[0],
+    'OPTIONS': {
+        **settings.TEMPLATES[0]['OPTIONS'],
+        'loaders': [('django.template.loaders.cached.Loader', [
+            'django.template.loaders.filesystem.Loader',
+            'django.template.loaders.app_directories.Loader',
+        ])],
+    },
+}]
+
+
+@override_settings(TEMPLATE_CACHE=True, TEMPLATES=CACHED_TEMPLATES)
+class TemplateCacheTests(SimpleTestCase):
+    def test_warm_up_compiles_every_template(self):
+        """warm_up компилирует шаблоны в кэш, reset его очищает"""
+        loader = _django_engines()[0].template_loaders[0]
+        compiled = warm_up()
+        self.assertGreater(compiled, 0)
+        self.assertIn('posts/index.html', loader.get_template_cache)
+        self.assertEqual(len(loader.get_template_cache), compiled)
+        reset()
+        self.assertEqual(loader.get_template_cache, {})
+
+    @override_settings(TEMPLATE_CACHE=False)
+    def test_warm_up_without_cache_does_nothing(self):
+        """Без TEMPLATE_CACHE шаблоны заранее не компилируются"""
+        self.assertEqual(warm_up(), 0)
+
+
+class ProfilingMiddlewareTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        profiling = override_settings(
+            PROFILING_SAMPLE_RATE=1, PROFILING_STATS_DIR=self.directory,
+            PROFILING_SLOW_QUERY_MS=10 ** 6)
+        profiling.enable()
+        self.addCleanup(profiling.disable)
+        self.addCleanup(reset_stats)
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        reset_stats()
+        cache.clear()
+
+    def test_requests_are_aggregated_by_view(self):
+        """Время, SQL, шаблоны и кэш суммируются по представлению"""
+        self.client.get(reverse('posts:index'))
+        self.client.get(reverse('posts:index'))
+        stats = snapshot()['posts:index']
+        self.assertEqual(stats['requests'], 2)
+        self.assertGreater(stats['queries'], 0)
+        self.assertGreater(stats['sql_time'], 0)
+        self.assertGreater(stats['template_time'], 0)
+        self.assertGreaterEqual(stats['time'], stats['template_time'])
+        self.assertGreater(stats['cache_hits'], 0)
+        self.assertGreater(stats['cache_misses'], 0)
+
+    def test_slow_queries_are_logged_with_view_name(self):
+        """Запросы дольше порога пишутся в лог с именем представления"""
+        with override_settings(PROFILING_SLOW_QUERY_MS=0):
+            with self.assertLogs('core.profiling', 'WARNING') as logs:
+                self.client.get(reverse('posts:index'))
+        self.assertIn('posts:index', logs.output[0])
+
+    def test_unsampled_requests_are_not_recorded(self):
+        """При PROFILING_SAMPLE_RATE = 0 ничего не замеряется"""
+        with override_settings(PROFILING_SAMPLE_RATE=0):
+            self.client.get(reverse('posts:index'))
+        self.assertEqual(snapshot(), {})
+
+    def test_command_prints_stats_of_all_processes(self):
+        """profiling_stats сохраняет итоги процесса и выводит таблицу"""
+        self.client.get(reverse('posts:index'))
+        output = StringIO()
+        call_command('profiling_stats', stdout=output)
+        self.assertIn('posts:index', output.getvalue())
+        self.assertEqual(load_stats()['posts:index']['requests'], 1)
+
+
+class MetricsTests(TestCase):
+    def setUp(self):
+        flush()
+        self.directory = tempfile.mkdtemp()
+        metrics = override_settings(
+            METRICS_DB=os.path.join(self.directory, 'metrics.sqlite3'),
+            METRICS_TOKEN='token')
+        metrics.enable()
+        self.addCleanup(metrics.disable)
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        cache.clear()
+
+    def get_metrics(self):
+        response = self.client.get(reverse('metrics'),
+                                   HTTP_AUTHORIZATION='Bearer token')
+        self.assertEqual(response.status_code, 200)
+        return response.content.decode().splitlines()
+
+    def test_requests_and_fragment_cache_are_counted(self):
+        """Время ответов и чтения кэша ленты считаются по представлениям"""
+        self.client.get(reverse('posts:index'))
+        self.client.get(reverse('posts:index'))
+        lines = self.get_metrics()
+        for line in (
+            'yatube_request_duration_seconds_count{view="posts:index"} 2',
+            'yatube_request_duration_seconds_bucket'
+            '{view="posts:index",le="+Inf"} 2',
+            'yatube_responses_total{view="posts:index",status="200"} 2',
+            'yatube_fragment_cache_requests_total'
+            '{view="posts:index",fragment="feed",result="hit"} 1',
+            'yatube_fragment_cache_requests_total'
+            '{view="posts:index",fragment="feed",result="miss"} 1',
+        ):
+            self.assertIn(line, lines)
+        self.assertTrue(any(
+            line.startswith('yatube_db_queries_total{view="posts:index"}')
+            for line in lines))
+
+    def test_samples_of_all_processes_are_summed(self):
+        """Приращения разных процессов складываются в общем файле"""
+        def observe():
+            REQUEST_SECONDS.observe(0.2, view='other')
+            flush()
+
+        REQUEST_SECONDS.observe(0.02, view='other')
+        process = multiprocessing.get_context('fork').Process(target=observe)
+        process.start()
+        process.join()
+        lines = self.get_metrics()
+        for line in (
+            'yatube_request_duration_seconds_bucket'
+            '{view="other",le="0.025"} 1',
+            'yatube_request_duration_seconds_bucket'
+            '{view="other",le="0.25"} 2',
+            'yatube_request_duration_seconds_count{view="other"} 2',
+        ):
+            self.assertIn(line, lines)
+
+    def test_metrics_require_token(self):
+        """Без верного токена и без METRICS_TOKEN метрики не отдаются"""
+        for header in ({}, {'HTTP_AUTHORIZATION': 'Bearer wrong'}):
+            with self.subTest(header=header):
+                response = self.client.get(reverse('metrics'), **header)
+                self.assertEqual(response.status_code, 404)
+        with self.settings(METRICS_TOKEN=''):
+            response = self.client.get(reverse('metrics'),
+                                       HTTP_AUTHORIZATION='Bearer ')
+            self.assertEqual(response.status_code, 404)
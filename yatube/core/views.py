@@ -1,5 +1,11 @@
+import hmac
+
+from django.conf import settings
+from django.http import Http404, HttpResponse
 from django.shortcuts import render
 
+from . import metrics as metrics_store
+
 
 def page_not_found(request, exception):
     return render(request, 'core/404.html', {'path': request.path}, status=404)
@@ -13,5 +19,19 @@ def permission_denied(request, exception):
     return render(request, 'core/403.html', status=403)
 
 
+def metrics(request):
+    """Метрики для Prometheus по заголовку Authorization: Bearer.
+
+    Без METRICS_TOKEN страница выключена: за прокси адрес клиента
+    всегда адрес прокси, и проверять его бесполезно.
+    """
+    token = settings.METRICS_TOKEN
+    header = request.META.get('HTTP_AUTHORIZATION', '')
+    if not token or not hmac.compare_digest(header, f'Bearer {token}'):
+        raise Http404
+    return HttpResponse(metrics_store.render(),
+                        content_type=metrics_store.CONTENT_TYPE)
+
+
 def csrf_failure(request, reason=''):
     return render(request, 'core/403csrf.html')
@@ -1,6 +1,7 @@
 from django.contrib import admin
 
 from . import models
+from .search import search_posts
 
 from mptt.admin import MPTTModelAdmin
 
@@ -18,6 +19,11 @@ class PostAdmin(admin.ModelAdmin):
     list_filter = ('pub_date',)
     empty_value_display = '-пусто-'
 
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term:
+            return queryset, False
+        return search_posts(search_term, queryset), False
+
 
 class GroupAdmin(admin.ModelAdmin):
     list_display = (
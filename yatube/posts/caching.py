@@ -0,0 +1,120 @@
+import hashlib
+import time
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.middleware.csrf import get_token
+from django.utils.cache import get_conditional_response
+
+from core.db.replicas import reading_from_replica
+
+from .models import Follow
+
+ALL_FEEDS = 'all'
+INDEX_FEED = 'index'
+
+
+def group_feed(group_id):
+    return f'group:{group_id}'
+
+
+def profile_feed(author_id):
+    return f'profile:{author_id}'
+
+
+def follow_feed(user_id):
+    return f'follow:{user_id}'
+
+
+def post_scope(post_id):
+    return f'post:{post_id}'
+
+
+def _version_key(feed):
+    return f'feed-version:{feed}'
+
+
+def get_feed_version(*feeds):
+    """Ключ кэша ленты, меняющийся при каждой инвалидации любой из feeds.
+
+    Поколение ALL_FEEDS входит в каждый ключ: его сброс устаревает
+    все ленты сразу, например при переименовании группы.
+    """
+    keys = [_version_key(feed) for feed in (ALL_FEEDS, *feeds)]
+    versions = cache.get_many(keys)
+    missing = {key: uuid4().hex for key in keys if key not in versions}
+    if missing:
+        cache.set_many(missing, None)
+        versions.update(missing)
+    return ':'.join(versions[key] for key in keys)
+
+
+def feed_cache_context(*feeds):
+    """Ключ и время жизни фрагмента ленты.
+
+    Лента, прочитанная с реплики, может отставать от только что
+    сброшенной версии, поэтому такие фрагменты живут недолго.
+    """
+    timeout = settings.FEED_CACHE_TIMEOUT
+    if reading_from_replica():
+        timeout = settings.REPLICA_FEED_CACHE_TIMEOUT
+    return {
+        'feed_cache_key': get_feed_version(*feeds),
+        'feed_cache_timeout': timeout,
+    }
+
+
+def feed_etag(request, *feeds):
+    """ETag страницы из версий feeds и того, кто её смотрит.
+
+    Кроме лент в ETag входят пользователь, его подписки (кнопка
+    «Подписаться») и cookie CSRF, токен которой есть в формах страницы;
+    get_token() заводит её уже на первом ответе, и ETag не меняется
+    при следующем запросе.
+    Страница, прочитанная с реплики, может отставать от версии, поэтому
+    такой ETag меняется каждые REPLICA_FEED_CACHE_TIMEOUT секунд.
+    """
+    user = request.user
+    if user.is_authenticated:
+        feeds = (*feeds, follow_feed(user.pk))
+    get_token(request)
+    parts = [get_feed_version(*feeds), str(user.pk),
+             request.META['CSRF_COOKIE']]
+    if reading_from_replica():
+        parts.append(str(int(
+            time.time() // settings.REPLICA_FEED_CACHE_TIMEOUT)))
+    return '"%s"' % hashlib.md5(':'.join(parts).encode()).hexdigest()
+
+
+def not_modified(request, etag):
+    """Ответ 304, если у клиента уже есть страница с этим ETag."""
+    return get_conditional_response(request, etag=etag)
+
+
+def invalidate_feeds(*feeds):
+    """Сбрасывает версии feeds после коммита текущей транзакции.
+
+    Читатель, получивший новую версию до коммита, прочитал бы ещё старые
+    строки и закэшировал бы их под новым ключом.
+    """
+    versions = {_version_key(feed): uuid4().hex for feed in feeds}
+    transaction.on_commit(lambda: cache.set_many(versions, None))
+
+
+def post_feeds(post):
+    feeds = [INDEX_FEED, profile_feed(post.author_id), post_scope(post.pk)]
+    if post.group_id:
+        feeds.append(group_feed(post.group_id))
+    followers = Follow.objects.filter(
+        author_id=post.author_id,
+        author__followers_count__lt=settings.FEED_FANOUT_LIMIT,
+    ).values_list('user_id', flat=True)
+    feeds.extend(follow_feed(user_id) for user_id in followers)
+    return feeds
+
+
+def invalidate_post(post, *old_group_ids):
+    invalidate_feeds(*post_feeds(post), *(
+        group_feed(group_id) for group_id in old_group_ids if group_id))
@@ -0,0 +1,27 @@
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.shortcuts import get_object_or_404
+
+from .models import Comment
+
+
+def get_comment_page(request, post):
+    """Страница веток комментариев поста: только корневые комментарии.
+
+    Ответы не загружаются, их число берётся из replies_count,
+    а сами ответы подгружаются через get_replies по запросу.
+    """
+    threads = Comment.objects.root_nodes().filter(
+        post=post).select_related('author')
+    paginator = Paginator(threads, settings.COMMENTS_LIMIT)
+    return paginator.get_page(request.GET.get('comments_page'))
+
+
+def get_replies(comment):
+    return comment.get_descendants().select_related('author')
+
+
+def get_comment_or_404(comment_id):
+    return get_object_or_404(
+        Comment.objects.select_related('post__author', 'post__group'),
+        id=comment_id)
@@ -0,0 +1,31 @@
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import Comment, Follow, Post, User
+
+
+def increment(model, pk, field):
+    model.objects.filter(pk=pk).update(**{field: F(field) + 1})
+
+
+def decrement(model, pk, field, amount=1):
+    model.objects.filter(pk=pk, **{f'{field}__gt': 0}).update(
+        **{field: Greatest(F(field) - amount, 0)})
+
+
+def _count(model, field):
+    rows = (model.objects.filter(**{field: OuterRef('pk')})
+            .order_by()
+            .values(field)
+            .annotate(total=Count('pk'))
+            .values('total'))
+    return Coalesce(Subquery(rows), 0)
+
+
+@transaction.atomic
+def rebuild_counters():
+    User.objects.update(posts_count=_count(Post, 'author'),
+                        followers_count=_count(Follow, 'author'))
+    Post.objects.update(comments_count=_count(Comment, 'post'))
+    Comment.objects.update(replies_count=_count(Comment, 'parent'))
@@ -0,0 +1,103 @@
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Q
+
+from .models import FeedItem, Follow, Post, User
+from .utils import get_page_obj
+
+
+def heavy_authors(user):
+    """Авторы из подписок user, чьи посты не раскладываются по лентам."""
+    return user.follower.filter(
+        author__followers_count__gte=settings.FEED_FANOUT_LIMIT
+    ).values_list('author', flat=True)
+
+
+def fan_out_post(post):
+    followers = list(Follow.objects.filter(
+        author_id=post.author_id).values_list('user_id', flat=True))
+    if not followers or len(followers) >= settings.FEED_FANOUT_LIMIT:
+        return
+    FeedItem.objects.bulk_create(
+        (FeedItem(user_id=user_id, post=post, pub_date=post.pub_date)
+         for user_id in followers),
+        ignore_conflicts=True,
+    )
+
+
+def add_author_to_feed(user_id, author_id):
+    if User.objects.filter(
+            pk=author_id,
+            followers_count__gte=settings.FEED_FANOUT_LIMIT).exists():
+        return
+    posts = Post.objects.filter(
+        author_id=author_id).values_list('pk', 'pub_date')
+    FeedItem.objects.bulk_create(
+        (FeedItem(user_id=user_id, post_id=pk, pub_date=pub_date)
+         for pk, pub_date in posts.iterator()),
+        batch_size=500,
+        ignore_conflicts=True,
+    )
+
+
+def remove_author_from_feed(user_id, author_id):
+    FeedItem.objects.filter(
+        user_id=user_id, post__author_id=author_id).delete()
+
+
+def backfill_after_unfollow(author_id):
+    """Раскладывает посты автора, число подписчиков которого опустилось
+    ниже FEED_FANOUT_LIMIT.
+
+    Посты, написанные, пока автор был «тяжёлым», в ленты не попали, а
+    теперь ленты его подписчиков читаются только из FeedItem.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'INSERT OR IGNORE INTO posts_feeditem (user_id, post_id, '
+            'pub_date) '
+            'SELECT follow.user_id, post.id, post.pub_date '
+            'FROM posts_user author '
+            'JOIN posts_follow follow ON follow.author_id = author.id '
+            'JOIN posts_post post ON post.author_id = author.id '
+            'WHERE author.id = %s AND author.followers_count = %s',
+            [author_id, settings.FEED_FANOUT_LIMIT - 1])
+
+
+@transaction.atomic
+def rebuild_feeds():
+    """Заново раскладывает посты по лентам всех подписок.
+
+    Как и add_author_to_feed, пропускает авторов, у которых подписчиков
+    не меньше FEED_FANOUT_LIMIT, поэтому followers_count должен быть
+    уже пересчитан. Возвращает число записей в лентах.
+    """
+    FeedItem.objects.all().delete()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'INSERT INTO posts_feeditem (user_id, post_id, pub_date) '
+            'SELECT follow.user_id, post.id, post.pub_date '
+            'FROM posts_follow follow '
+            'JOIN posts_user author ON author.id = follow.author_id '
+            'JOIN posts_post post ON post.author_id = follow.author_id '
+            'WHERE author.followers_count < %s',
+            [settings.FEED_FANOUT_LIMIT])
+    return FeedItem.objects.count()
+
+
+def get_follow_page(request, heavy):
+    user = request.user
+    if heavy:
+        posts = Post.objects.select_related('author', 'group').filter(
+            Q(pk__in=user.feed_items.values('post'))
+            | Q(author__in=heavy)
+        )
+        return get_page_obj(request, posts, keyset=True)
+    return get_page_obj(request, user.feed_items.all(), keyset=True,
+                        transform=_feed_posts)
+
+
+def _feed_posts(items):
+    post_ids = [item.post_id for item in items]
+    posts = Post.objects.select_related('author', 'group').in_bulk(post_ids)
+    return [posts[pk] for pk in post_ids if pk in posts]
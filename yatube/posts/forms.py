@@ -1,11 +1,14 @@
 from django import forms
 
 from .models import Comment, Group, Post, User
+from .uploads import MasterImagesMixin
 
 from mptt.forms import TreeNodeChoiceField
 
 
-class PostForm(forms.ModelForm):
+class PostForm(MasterImagesMixin, forms.ModelForm):
+    image_fields = ('image',)
+
     class Meta:
         model = Post
         fields = ('text', 'group', 'image')
@@ -26,7 +29,9 @@ class CommentForm(forms.ModelForm):
         }
 
 
-class EditProfileForm(forms.ModelForm):
+class EditProfileForm(MasterImagesMixin, forms.ModelForm):
+    image_fields = ('avatar',)
+
     class Meta:
         model = User
         fields = ('first_name', 'last_name', 'email', 'birth_date', 'avatar',
@@ -49,6 +54,14 @@ class EditProfileForm(forms.ModelForm):
         }
 
 
+class SearchForm(forms.Form):
+    q = forms.CharField(label='Поиск', max_length=200)
+    group = forms.ModelChoiceField(Group.objects.all(), to_field_name='slug',
+                                   required=False, label='Группа',
+                                   empty_label='Все группы')
+    author = forms.CharField(label='Автор', max_length=150, required=False)
+
+
 class EditGroupsForm(forms.ModelForm):
     class Meta:
         model = Group
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from posts.models import Follow
+
+
+class Command(BaseCommand):
+    help = ('Удаляет повторные подписки; запускать перед миграцией, '
+            'добавляющей ограничение unique_follow')
+
+    @transaction.atomic
+    def handle(self, *args, **options):
+        # Одним запросом и без сигналов: до миграций ещё нет ни счётчиков,
+        # ни лент, их после миграций строят rebuild_counters и
+        # rebuild_feeds.
+        table = connection.ops.quote_name(Follow._meta.db_table)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {table} WHERE id NOT IN ('
+                f'SELECT MIN(id) FROM {table} GROUP BY user_id, author_id)')
+            deleted = cursor.rowcount
+        self.stdout.write(self.style.SUCCESS(
+            f'Удалено повторных подписок: {deleted}'))
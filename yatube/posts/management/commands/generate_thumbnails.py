@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from posts.models import Post, User
+from posts.signals import IMAGE_FIELDS
+from posts.thumbnails import generate
+
+
+class Command(BaseCommand):
+    help = 'Создаёт недостающие миниатюры картинок постов и аватарок'
+
+    def handle(self, *args, **options):
+        for model in (Post, User):
+            field, size = IMAGE_FIELDS[model]
+            rows = (model.objects.exclude(**{f'{field}__isnull': True})
+                    .exclude(**{field: ''}).values_list('pk', field))
+            for pk, name in rows.iterator():
+                generate(model, pk, field, name, size)
+        self.stdout.write(self.style.SUCCESS('Миниатюры созданы'))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from posts.feeds import rebuild_feeds
+
+
+class Command(BaseCommand):
+    help = ('Заново раскладывает посты по лентам подписок; запускать '
+            'после rebuild_counters')
+
+    def handle(self, *args, **options):
+        total = rebuild_feeds()
+        self.stdout.write(self.style.SUCCESS(
+            f'Ленты подписок перестроены, записей: {total}'))
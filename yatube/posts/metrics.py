@@ -0,0 +1,15 @@
+from django.db import transaction
+
+from core.metrics import Counter, Histogram
+
+CREATED = Counter(
+    'yatube_objects_created_total',
+    'Созданные посты, комментарии и подписки.', labels=('model',))
+THUMBNAIL_SECONDS = Histogram(
+    'yatube_thumbnail_generation_seconds',
+    'Время нарезки всех вариантов одной картинки.', labels=('size',))
+
+
+def count_created(model):
+    """Учитывает объект после коммита, чтобы откаты не попадали в счёт."""
+    transaction.on_commit(lambda: CREATED.inc(model=model))
@@ -16,6 +16,11 @@ class User(AbstractUser):
     city = models.CharField('Город', max_length=30, blank=True, null=True)
     permission = models.CharField('Тип пользователя', max_length=30,
                                   choices=access_rights, blank=True, null=True)
+    posts_count = models.PositiveIntegerField('Количество постов', default=0,
+                                              editable=False)
+    followers_count = models.PositiveIntegerField('Количество подписчиков',
+                                                  default=0, editable=False)
+    updated = models.DateTimeField('Дата изменения', auto_now=True)
 
 
 class Group(models.Model):
@@ -35,6 +40,7 @@ class Group(models.Model):
 class Post(models.Model):
     text = models.TextField('Текст поста', help_text='Введите текст поста')
     pub_date = models.DateTimeField('Дата', auto_now_add=True)
+    updated = models.DateTimeField('Дата изменения', auto_now=True)
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -56,9 +62,18 @@ class Post(models.Model):
         blank=True,
         null=True
     )
+    comments_count = models.PositiveIntegerField(
+        'Количество комментариев', default=0, editable=False)
 
     class Meta:
         ordering = ('-pub_date',)
+        indexes = (
+            models.Index(fields=('-pub_date',), name='post_pub_date_idx'),
+            models.Index(fields=('group', '-pub_date'),
+                         name='post_group_pub_date_idx'),
+            models.Index(fields=('author', '-pub_date'),
+                         name='post_author_pub_date_idx'),
+        )
         verbose_name = 'Пост'
         verbose_name_plural = 'Посты'
 
@@ -66,6 +81,36 @@ class Post(models.Model):
         return self.text[:15]
 
 
+class SearchField(models.TextField):
+    """Колонка полнотекстового индекса, поддерживает lookup match."""
+
+
+@SearchField.register_lookup
+class Match(models.Lookup):
+    lookup_name = 'match'
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f'{lhs} MATCH {rhs}', [*lhs_params, *rhs_params]
+
+
+class PostSearch(models.Model):
+    """Строка FTS5-таблицы posts_post_fts; rowid совпадает с id поста.
+
+    Таблицу создаёт и наполняет posts.search, а не миграции.
+    """
+    post = models.OneToOneField(
+        Post, primary_key=True, db_column='rowid',
+        on_delete=models.DO_NOTHING, related_name='search')
+    text = SearchField()
+    rank = models.FloatField()
+
+    class Meta:
+        managed = False
+        db_table = 'posts_post_fts'
+
+
 class Comment(MPTTModel):
     post = models.ForeignKey(
         Post,
@@ -89,6 +134,8 @@ class Comment(MPTTModel):
     text = models.TextField('Текст комментария',
                             help_text='Прокомментируйте пост')
     created = models.DateTimeField('Дата комментария', auto_now_add=True)
+    replies_count = models.PositiveIntegerField('Количество ответов',
+                                                default=0, editable=False)
 
     class MPTTMeta:
         order_insertion_by = ('-created',)
@@ -103,5 +150,32 @@ class Follow(models.Model):
 
     class Meta:
         ordering = ('author',)
+        constraints = (
+            models.UniqueConstraint(fields=('user', 'author'),
+                                    name='unique_follow'),
+        )
         verbose_name = 'Подписка'
         verbose_name_plural = 'Подписки'
+
+
+class FeedItem(models.Model):
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name='feed_items',
+        verbose_name='Читатель')
+    post = models.ForeignKey(
+        Post, on_delete=models.CASCADE, related_name='feed_items',
+        verbose_name='Пост')
+    pub_date = models.DateTimeField('Дата поста')
+
+    class Meta:
+        ordering = ('-pub_date',)
+        indexes = (
+            models.Index(fields=('user', '-pub_date'),
+                         name='feed_item_user_pub_date_idx'),
+        )
+        constraints = (
+            models.UniqueConstraint(fields=('user', 'post'),
+                                    name='unique_feed_item'),
+        )
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Лента подписок'
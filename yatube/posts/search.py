@@ -0,0 +1,76 @@
+"""Полнотекстовый поиск по постам.
+
+На SQLite посты индексируются в FTS5-таблице posts_post_fts, результаты
+сортируются по bm25. На других базах поиск сводится к icontains.
+"""
+import re
+
+from django.db import connection, connections
+
+from .models import Post, PostSearch
+
+SCHEMA = (
+    f'CREATE VIRTUAL TABLE IF NOT EXISTS {PostSearch._meta.db_table} '
+    "USING fts5(text, tokenize='unicode61 remove_diacritics 2')"
+)
+MAX_TERMS = 10
+WORD = re.compile(r'\w+')
+
+
+def is_enabled(using='default'):
+    return connections[using].vendor == 'sqlite'
+
+
+def create_index(using='default', **kwargs):
+    if is_enabled(using):
+        with connections[using].cursor() as cursor:
+            cursor.execute(SCHEMA)
+
+
+def index_post(post):
+    if not is_enabled():
+        return
+    table = PostSearch._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {table} WHERE rowid = %s', (post.pk,))
+        cursor.execute(f'INSERT INTO {table} (rowid, text) VALUES (%s, %s)',
+                       (post.pk, post.text))
+
+
+def unindex_post(post_id):
+    if not is_enabled():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {PostSearch._meta.db_table} WHERE rowid = %s',
+            (post_id,))
+
+
+def rebuild_index():
+    if not is_enabled():
+        return
+    table = PostSearch._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(SCHEMA)
+        cursor.execute(f'DELETE FROM {table}')
+        cursor.execute(f'INSERT INTO {table} (rowid, text) '
+                       f'SELECT id, text FROM {Post._meta.db_table}')
+
+
+def search_posts(query, posts=None):
+    """Посты, содержащие все слова query, самые релевантные первыми.
+
+    Каждое слово ищется как префикс, чтобы находить его словоформы.
+    """
+    if posts is None:
+        posts = Post.objects.all()
+    words = WORD.findall(query.lower())[:MAX_TERMS]
+    if not words:
+        return posts.none()
+    if not is_enabled():
+        for word in words:
+            posts = posts.filter(text__icontains=word)
+        return posts
+    match = ' '.join(f'"{word}"*' for word in words)
+    return posts.filter(search__text__match=match).order_by(
+        'search__rank', '-pub_date')
@@ -0,0 +1,186 @@
+import threading
+
+from django.core.signals import request_started
+from django.db.models.signals import (post_delete, post_init, post_save,
+                                      pre_delete)
+from django.dispatch import receiver
+
+from . import feeds, search, thumbnails
+from .caching import (ALL_FEEDS, follow_feed, invalidate_feeds,
+                      invalidate_post, post_scope, profile_feed)
+from .counters import decrement, increment
+from .metrics import count_created
+from .models import Comment, Follow, Group, Post, User
+
+TRACKED_FIELDS = {
+    Post: ('group_id', 'image'),
+    Group: ('title', 'slug'),
+    User: ('username', 'first_name', 'last_name', 'avatar'),
+}
+IMAGE_FIELDS = {
+    Post: ('image', 'post'),
+    User: ('avatar', 'avatar'),
+}
+
+_deleting = threading.local()
+
+
+def deleting_posts():
+    """pk постов, которые сейчас удаляются в этом потоке."""
+    if not hasattr(_deleting, 'posts'):
+        _deleting.posts = set()
+    return _deleting.posts
+
+
+def deleting_comments():
+    """Удаляемые сейчас комментарии: {post_id: [pk комментариев, осталось]}.
+
+    Django шлёт pre_delete для всего каскада до первого post_delete,
+    поэтому счётчики можно поправить одним запросом на весь каскад,
+    а счётчики удаляемых вместе с ним поста и веток не трогать.
+    """
+    if not hasattr(_deleting, 'comments'):
+        _deleting.comments = {}
+    return _deleting.comments
+
+
+@receiver(request_started)
+def reset_deleting(**kwargs):
+    """Забывает каскады, оборванные ошибкой между pre_delete и post_delete.
+
+    Иначе пост навсегда остался бы «удаляемым» для этого потока, и
+    удаление его комментариев не меняло бы счётчики и ленты.
+    """
+    _deleting.__dict__.clear()
+
+
+def delete_with_cascade(instance):
+    """instance.delete(), после которого состояние каскада чисто
+    и при ошибке удаления.
+    """
+    try:
+        return instance.delete()
+    finally:
+        reset_deleting()
+
+
+def changed_fields(instance):
+    initial = getattr(instance, '_initial_state', {})
+    return {field for field, value in initial.items()
+            if getattr(instance, field) != value}
+
+
+def schedule_thumbnail(sender, instance, created):
+    field, size = IMAGE_FIELDS[sender]
+    if created or field in changed_fields(instance):
+        thumbnails.schedule(getattr(instance, field), size)
+
+
+@receiver(post_init, sender=Post)
+@receiver(post_init, sender=Group)
+@receiver(post_init, sender=User)
+def remember_initial_state(sender, instance, **kwargs):
+    instance._initial_state = {
+        field: instance.__dict__.get(field)
+        for field in TRACKED_FIELDS[sender]}
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, **kwargs):
+    if created:
+        increment(User, instance.author_id, 'posts_count')
+        feeds.fan_out_post(instance)
+        count_created('post')
+    schedule_thumbnail(sender, instance, created)
+    update_fields = kwargs['update_fields']
+    if not update_fields or 'text' in update_fields:
+        search.index_post(instance)
+    old_group_id = instance._initial_state['group_id']
+    invalidate_post(instance, old_group_id)
+    remember_initial_state(sender, instance)
+
+
+@receiver(pre_delete, sender=Post)
+def post_deleting(sender, instance, **kwargs):
+    deleting_posts().add(instance.pk)
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    deleting_posts().discard(instance.pk)
+    decrement(User, instance.author_id, 'posts_count')
+    search.unindex_post(instance.pk)
+    invalidate_post(instance)
+
+
+@receiver(post_save, sender=Follow)
+def follow_saved(sender, instance, created, **kwargs):
+    if created:
+        increment(User, instance.author_id, 'followers_count')
+        feeds.add_author_to_feed(instance.user_id, instance.author_id)
+        invalidate_feeds(follow_feed(instance.user_id),
+                         profile_feed(instance.author_id))
+        count_created('follow')
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    decrement(User, instance.author_id, 'followers_count')
+    feeds.remove_author_from_feed(instance.user_id, instance.author_id)
+    feeds.backfill_after_unfollow(instance.author_id)
+    invalidate_feeds(follow_feed(instance.user_id),
+                     profile_feed(instance.author_id))
+
+
+@receiver(post_save, sender=Comment)
+def comment_saved(sender, instance, created, **kwargs):
+    if created:
+        increment(Post, instance.post_id, 'comments_count')
+        if instance.parent_id:
+            increment(Comment, instance.parent_id, 'replies_count')
+        count_created('comment')
+    invalidate_feeds(post_scope(instance.post_id))
+
+
+@receiver(pre_delete, sender=Comment)
+def comment_deleting(sender, instance, **kwargs):
+    batch = deleting_comments().setdefault(instance.post_id, [set(), 0])
+    batch[0].add(instance.pk)
+    batch[1] += 1
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    batch = deleting_comments()[instance.post_id]
+    batch[1] -= 1
+    if instance.parent_id and instance.parent_id not in batch[0]:
+        decrement(Comment, instance.parent_id, 'replies_count')
+    if batch[1]:
+        return
+    del deleting_comments()[instance.post_id]
+    if instance.post_id not in deleting_posts():
+        decrement(Post, instance.post_id, 'comments_count', len(batch[0]))
+        invalidate_feeds(post_scope(instance.post_id))
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_save, sender=User)
+def shown_in_cards_saved(sender, instance, created, **kwargs):
+    if sender is User:
+        schedule_thumbnail(sender, instance, created)
+    changed = set() if created else changed_fields(instance)
+    # thumbnails.generate сохраняет только updated, когда миниатюры
+    # аватарки готовы.
+    ready_avatar = sender is User and 'updated' in (
+        kwargs['update_fields'] or ())
+    if changed - {'avatar'}:
+        invalidate_feeds(ALL_FEEDS)
+    elif changed or ready_avatar:
+        invalidate_feeds(profile_feed(instance.pk))
+    remember_initial_state(sender, instance)
+
+
+@receiver(post_delete, sender=Group)
+@receiver(post_delete, sender=User)
+def shown_in_cards_deleted(sender, instance, **kwargs):
+    invalidate_feeds(ALL_FEEDS)
@@ -0,0 +1,30 @@
+from django import template
+from django.templatetags.static import static
+
+from ..thumbnails import MIME_TYPES, SIZES, cached_variants, schedule
+
+register = template.Library()
+
+
+def _srcset(thumbnails):
+    return ', '.join(f'{url} {width}w' for width, url in thumbnails)
+
+
+@register.inclusion_tag('posts/includes/picture.html')
+def responsive_image(image, size):
+    ready = cached_variants(image, size)
+    if ready is None:
+        schedule(image, size)
+        width, height = SIZES[size]['geometry']
+        return {'src': static('img/placeholder.svg'),
+                'width': width, 'height': height}
+    fallback = ready.pop(None)
+    base_width = SIZES[size]['geometry'][0]
+    return {
+        'src': dict(fallback)[base_width],
+        'srcset': _srcset(fallback),
+        'sources': [{'type': MIME_TYPES[image_format],
+                     'srcset': _srcset(thumbnails)}
+                    for image_format, thumbnails in ready.items()],
+        'sizes': SIZES[size]['sizes'],
+    }
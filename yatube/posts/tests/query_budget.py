@@ -0,0 +1,126 @@
+"""Замеры числа SQL-запросов всех адресов posts/urls.py.
+
+seed(size) создаёт набор данных, растущий вместе с size: посты автора,
+ветки комментариев с ответами, подписки и группы. url_cases() строит
+запрос к каждому адресу приложения, measure() выполняет его с пустым
+кэшем и откатывает изменения. report() — худшие представления по числу
+запросов и самые частые повторяющиеся запросы в них.
+"""
+import re
+from collections import Counter
+
+from django.contrib.auth.models import Permission
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .. import urls
+from ..models import Comment, Follow, Group, Post, User
+
+LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+
+
+def seed(size):
+    """Набор данных, в котором всего примерно в size раз больше."""
+    author = User.objects.create_user(username='author')
+    reader = User.objects.create_user(username='reader')
+    moderator = User.objects.create_user(username='moderator')
+    moderator.user_permissions.set(Permission.objects.filter(
+        codename__in=('view_group', 'add_group', 'change_group',
+                      'delete_group')))
+    group = Group.objects.create(title='Группа', slug='group')
+    for number in range(size):
+        Group.objects.create(title=f'Группа {number}', slug=f'group-{number}')
+        other = User.objects.create_user(username=f'other_{number}')
+        Follow.objects.create(user=reader, author=other)
+        Follow.objects.create(user=other, author=author)
+        Post.objects.create(author=other, group=group,
+                            text=f'Пост читаемого автора {number}')
+    Follow.objects.create(user=reader, author=author)
+    posts = [Post.objects.create(author=author, group=group,
+                                 text=f'Пост про кота {number}')
+             for number in range(3 * size)]
+    post = posts[-1]
+    for number in range(2 * size):
+        thread = Comment.objects.create(
+            post=post, author=reader, text=f'Комментарий {number}')
+        parent = thread
+        for depth in range(size):
+            parent = Comment.objects.create(
+                post=post, author=author, parent=parent,
+                text=f'Ответ {number}.{depth}')
+    return {
+        'author': author,
+        'reader': reader,
+        'moderator': moderator,
+        'group': group,
+        'post': post,
+        'comment': thread,
+        'reply': parent,
+    }
+
+
+def url_cases(data):
+    """Пары (имя адреса, адрес, пользователь) для всех адресов posts."""
+    author, post = data['author'], data['post']
+    arguments = {
+        'slug': data['group'].slug,
+        'username': author.username,
+        'post_id': post.pk,
+        'comment_id': data['comment'].pk,
+        'group_id': data['group'].pk,
+    }
+    users = {
+        'edit_comment': data['reader'],
+        'follow_index': data['reader'],
+        'profile_follow': data['reader'],
+        'profile_unfollow': data['reader'],
+    }
+    queries = {'search': '?q=кот'}
+    for pattern in urls.urlpatterns:
+        name = pattern.name
+        user = users.get(name, author)
+        if name.startswith('group'):
+            user = data['moderator']
+        url = reverse(f'{urls.app_name}:{name}', kwargs={
+            key: arguments[key] for key in pattern.pattern.converters})
+        yield name, url + queries.get(name, ''), user
+
+
+def measure(url, user):
+    """Код ответа и запросы к url с пустым кэшем.
+
+    Изменения в базе откатываются, поэтому удаление или отписка не
+    влияют на следующие замеры.
+    """
+    client = Client()
+    client.force_login(user)
+    cache.clear()
+    with transaction.atomic():
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(url)
+        transaction.set_rollback(True)
+    return response.status_code, [
+        query['sql'] for query in queries.captured_queries]
+
+
+def normalize(sql):
+    return LITERALS.sub('?', sql)
+
+
+def report(results, limit=10):
+    """Текст отчёта по результатам {имя: {size: [sql, ...]}}."""
+    lines = []
+    rows = sorted(results.items(), reverse=True, key=lambda item: (
+        len(item[1][max(item[1])]), item[0]))
+    for name, by_size in rows[:limit]:
+        counts = ' -> '.join(f'{len(by_size[size])}' for size in sorted(
+            by_size))
+        lines.append(f'{name}: {counts} запросов')
+        largest = by_size[max(by_size)]
+        for sql, repeats in Counter(map(normalize, largest)).most_common(3):
+            if repeats > 1:
+                lines.append(f'    {repeats} x {sql[:150]}')
+    return '\n'.join(lines)
@@ -1,11 +1,13 @@
 import shutil
 import tempfile
 from http import HTTPStatus
+from io import BytesIO
 
 from django.conf import settings
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import Client, override_settings, TestCase
 from django.urls import reverse
+from PIL import Image
 
 from ..models import Group, Post, User
 
@@ -120,3 +122,56 @@ class PostFormTest(TestCase):
         self.assertEqual(posts_count, posts_count_create)
         self.assertRedirects(response,
                              login_redirect + reverse('posts:post_create'))
+
+    def upload_png(self, size):
+        buffer = BytesIO()
+        Image.new('RGB', size, color=(255, 0, 0)).save(buffer, 'PNG')
+        return SimpleUploadedFile(name='big.png', content=buffer.getvalue(),
+                                  content_type='image/png')
+
+    @override_settings(IMAGE_MASTER_SIZE=20)
+    def test_create_post_stores_downscaled_master(self):
+        """В хранилище попадает уменьшенная копия картинки"""
+        self.authorized_client.post(
+            reverse('posts:post_create'),
+            data={'text': 'Пост с картинкой',
+                  'image': self.upload_png((60, 30))})
+        post = Post.objects.get(text='Пост с картинкой')
+        self.assertEqual(post.image.name, 'posts/big.png')
+        with Image.open(post.image.path) as image:
+            self.assertEqual(image.size, (20, 10))
+
+    def test_create_post_rejects_oversized_image(self):
+        """Слишком большие файлы и картинки не принимаются"""
+        limits = (
+            ({'UPLOAD_MAX_SIZE': 10}, 'Файл больше'),
+            ({'IMAGE_MAX_PIXELS': 100}, 'Картинка больше'),
+        )
+        for limit, error in limits:
+            with self.subTest(limit=limit), override_settings(**limit):
+                response = self.authorized_client.post(
+                    reverse('posts:post_create'),
+                    data={'text': 'Пост с картинкой',
+                          'image': self.upload_png((60, 30))})
+                self.assertIn(error, response.context['form'].errors[
+                    'image'][0])
+        self.assertFalse(Post.objects.filter(
+            text='Пост с картинкой').exists())
+
+    @override_settings(UPLOAD_MAX_SIZE=10)
+    def test_oversized_upload_keeps_following_fields(self):
+        """Форма со слишком большим файлом показывает ошибку, а поля
+        после файла доходят до неё
+        """
+        response = self.authorized_client.post(
+            reverse('posts:post_create'),
+            data={'image': self.upload_png((60, 30)),
+                  'text': 'Текст после файла',
+                  'group': self.group.pk})
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertContains(response, 'Файл больше 10')
+        self.assertContains(response, 'Текст после файла')
+        self.assertEqual(response.context['form']['group'].value(),
+                         str(self.group.pk))
+        self.assertFalse(Post.objects.filter(
+            text='Текст после файла').exists())
@@ -1,6 +1,13 @@
-from django.test import TestCase
+from io import StringIO
 
-from ..models import Group, Post, User
+from django.core.management import call_command
+from django.db import IntegrityError, connection, transaction
+from django.db.models.signals import post_delete
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from ..models import Comment, FeedItem, Follow, Group, Post, User
+from ..signals import delete_with_cascade
 
 
 class PostModelTests(TestCase):
@@ -53,3 +60,118 @@ class PostModelTests(TestCase):
             with self.subTest(field=field):
                 self.assertEqual(post._meta.get_field(field).help_text,
                                  expected_value)
+
+
+class CounterTests(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username='author')
+        self.reader = User.objects.create_user(username='reader')
+        self.post = Post.objects.create(author=self.author, text='Пост')
+
+    def assert_counters(self, posts, followers, comments, replies):
+        self.author.refresh_from_db()
+        self.post.refresh_from_db()
+        self.comment.refresh_from_db()
+        self.assertEqual(self.author.posts_count, posts)
+        self.assertEqual(self.author.followers_count, followers)
+        self.assertEqual(self.post.comments_count, comments)
+        self.assertEqual(self.comment.replies_count, replies)
+
+    def test_counters_follow_changes(self):
+        """Счётчики обновляются при создании и удалении объектов."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.comment = Comment.objects.create(
+            post=self.post, author=self.reader, text='Комментарий')
+        reply = Comment.objects.create(post=self.post, author=self.author,
+                                       text='Ответ', parent=self.comment)
+        self.assert_counters(posts=1, followers=1, comments=2, replies=1)
+        reply.delete()
+        Follow.objects.filter(user=self.reader).delete()
+        self.assert_counters(posts=1, followers=0, comments=1, replies=0)
+        Post.objects.create(author=self.author, text='Пост 2')
+        self.assert_counters(posts=2, followers=0, comments=1, replies=0)
+
+    def test_cascade_delete_updates_counters_once(self):
+        """Удаление ветки правит счётчики одним запросом на каскад."""
+        self.comment = Comment.objects.create(
+            post=self.post, author=self.reader, text='Комментарий')
+        reply = Comment.objects.create(post=self.post, author=self.author,
+                                       text='Ответ', parent=self.comment)
+        for number in range(3):
+            Comment.objects.create(post=self.post, author=self.reader,
+                                   text=f'Ответ {number}', parent=reply)
+        self.assert_counters(posts=1, followers=0, comments=5, replies=1)
+        with CaptureQueriesContext(connection) as queries:
+            reply.delete()
+        counter_updates = [query for query in queries.captured_queries
+                           if query['sql'].startswith('UPDATE')
+                           and '_count' in query['sql']]
+        self.assertEqual(len(counter_updates), 2)
+        self.assert_counters(posts=1, followers=0, comments=1, replies=0)
+        self.post.delete()
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.posts_count, 0)
+
+    def test_failed_cascade_does_not_leak_into_next_delete(self):
+        """Оборванный ошибкой каскад не мешает следующим удалениям."""
+        def fail(**kwargs):
+            raise RuntimeError
+        self.comment = Comment.objects.create(
+            post=self.post, author=self.reader, text='Комментарий')
+        post_delete.connect(fail, sender=Comment)
+        try:
+            with self.assertRaises(RuntimeError), transaction.atomic():
+                delete_with_cascade(self.post)
+        finally:
+            post_delete.disconnect(fail, sender=Comment)
+        comment = Comment.objects.create(post=self.post, author=self.reader,
+                                         text='Ещё комментарий')
+        self.assert_counters(posts=1, followers=0, comments=2, replies=0)
+        comment.delete()
+        self.assert_counters(posts=1, followers=0, comments=1, replies=0)
+
+    def test_rebuild_counters_command(self):
+        """Команда rebuild_counters восстанавливает счётчики."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.comment = Comment.objects.create(
+            post=self.post, author=self.reader, text='Комментарий')
+        Comment.objects.create(post=self.post, author=self.author,
+                               text='Ответ', parent=self.comment)
+        User.objects.update(posts_count=0, followers_count=7)
+        Post.objects.update(comments_count=0)
+        Comment.objects.update(replies_count=5)
+        call_command('rebuild_counters', stdout=StringIO())
+        self.assert_counters(posts=1, followers=1, comments=2, replies=1)
+
+    @override_settings(FEED_FANOUT_LIMIT=2)
+    def test_rebuild_feeds_command(self):
+        """Команда rebuild_feeds строит ленты для уже существующих подписок
+        и не раскладывает посты авторов с FEED_FANOUT_LIMIT подписчиков.
+        """
+        heavy = User.objects.create_user(username='heavy')
+        heavy_post = Post.objects.create(author=heavy, text='Пост heavy')
+        other = User.objects.create_user(username='other')
+        Follow.objects.bulk_create([
+            Follow(user=self.reader, author=self.author),
+            Follow(user=self.reader, author=heavy),
+            Follow(user=other, author=heavy),
+        ])
+        FeedItem.objects.all().delete()
+        call_command('rebuild_counters', stdout=StringIO())
+        call_command('rebuild_feeds', stdout=StringIO())
+        self.assertEqual(
+            list(self.reader.feed_items.values_list('post', flat=True)),
+            [self.post.pk])
+        self.assertFalse(FeedItem.objects.filter(post=heavy_post).exists())
+
+
+class FollowConstraintTests(TestCase):
+    def test_follow_is_unique(self):
+        """Повторная подписка на автора запрещена на уровне базы."""
+        author = User.objects.create_user(username='author')
+        reader = User.objects.create_user(username='reader')
+        Follow.objects.create(user=reader, author=author)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Follow.objects.create(user=reader, author=author)
+        Follow.objects.get_or_create(user=reader, author=author)
+        self.assertEqual(Follow.objects.count(), 1)
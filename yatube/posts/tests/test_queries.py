@@ -0,0 +1,96 @@
+"""Бюджеты SQL-запросов адресов posts/urls.py.
+
+Отчёт о худших представлениях и повторяющихся в них запросах:
+
+    QUERY_BUDGET_REPORT=report.txt pytest yatube/posts/tests/test_queries.py
+"""
+import os
+from http import HTTPStatus
+
+from django.db import transaction
+from django.test import TestCase
+
+from . import query_budget
+
+SIZES = (1, 4)
+# Наибольшее число запросов на самом большом наборе данных.
+BUDGETS = {
+    'index': 6,
+    'group_list': 7,
+    'profile': 8,
+    'edit_profile': 5,
+    'post_detail': 8,
+    'post_create': 7,
+    'post_edit': 7,
+    'post_delete': 14,
+    'add_comment': 5,
+    'add_child_comment': 10,
+    'comment_replies': 4,
+    'delete_comment': 15,
+    'edit_comment': 9,
+    'search': 7,
+    'follow_index': 8,
+    'profile_follow': 6,
+    'profile_unfollow': 9,
+    'groups_index': 5,
+    'group_create': 4,
+    'group_edit': 5,
+    'group_delete': 8,
+}
+# Представления, которым позволено делать больше запросов с ростом
+# данных, и причина.
+SCALES_WITH_DATA = {
+    'delete_comment': 'каскад по parent выбирает ветку по уровню за '
+                      'запрос: число запросов растёт с глубиной ветки',
+}
+
+
+class QueryBudgetTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.results = {}
+        cls.statuses = {}
+        for size in SIZES:
+            with transaction.atomic():
+                data = query_budget.seed(size)
+                for name, url, user in query_budget.url_cases(data):
+                    status, queries = query_budget.measure(url, user)
+                    cls.statuses[name] = status
+                    cls.results.setdefault(name, {})[size] = queries
+                transaction.set_rollback(True)
+        path = os.getenv('QUERY_BUDGET_REPORT')
+        if path:
+            with open(path, 'w') as file:
+                file.write(query_budget.report(cls.results, limit=None))
+
+    def test_every_posts_url_is_measured(self):
+        """Каждый адрес posts/urls.py есть в замерах и в бюджетах"""
+        self.assertEqual(set(self.results), set(BUDGETS))
+
+    def test_measured_pages_respond(self):
+        """Замеренные страницы отвечают без ошибок сервера"""
+        for name, status in self.statuses.items():
+            with self.subTest(view=name):
+                self.assertLess(status, HTTPStatus.INTERNAL_SERVER_ERROR)
+
+    def test_queries_do_not_grow_with_data(self):
+        """Число запросов не зависит от объёма данных"""
+        for name, by_size in self.results.items():
+            if name in SCALES_WITH_DATA:
+                continue
+            with self.subTest(view=name):
+                counts = [len(by_size[size]) for size in SIZES]
+                self.assertEqual(
+                    len(set(counts)), 1,
+                    f'{name}: {counts}\n'
+                    + query_budget.report({name: by_size}))
+
+    def test_queries_fit_budget(self):
+        """Число запросов не больше бюджета представления"""
+        for name, by_size in self.results.items():
+            with self.subTest(view=name):
+                queries = by_size[max(SIZES)]
+                self.assertLessEqual(
+                    len(queries), BUDGETS.get(name, 0),
+                    query_budget.report({name: by_size}))
@@ -44,10 +44,13 @@ class PostsURLTests(TestCase):
             ('posts:post_edit', (self.post.id,),
              f'/posts/{self.post.id}/edit/'),
             ('posts:follow_index', None, '/follow/'),
+            ('posts:search', None, '/search/'),
             ('posts:add_comment', (self.post.id,),
              f'/posts/{self.post.id}/comment/'),
             ('posts:edit_comment', (self.comment.id,),
              f'/posts/comment/{self.comment.id}/edit/'),
+            ('posts:comment_replies', (self.comment.id,),
+             f'/posts/comment/{self.comment.id}/replies/'),
             ('posts:delete_comment', (self.comment.id,),
              f'/posts/comment/{self.comment.id}/delete/'),
             ('posts:profile_follow', (self.user_2,),
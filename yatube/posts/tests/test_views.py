@@ -1,14 +1,23 @@
 import shutil
 import tempfile
 from http import HTTPStatus
+from io import BytesIO
 
 from django import forms
 from django.conf import settings
 from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.test import Client, override_settings, TestCase
+from django.db import connection, transaction
+from django.template import Context, Template
+from django.test import (Client, override_settings, TestCase,
+                         TransactionTestCase)
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from PIL import Image
 
+from .. import thumbnails
+from ..caching import INDEX_FEED, get_feed_version
 from ..forms import PostForm
 from ..models import Comment, Follow, Group, Post, User
 
@@ -174,6 +183,37 @@ class PostViewsTest(TestCase):
         self.assertRedirects(response_1, reverse('posts:profile',
                                                  args=(self.post.author,)))
 
+    def test_thumbnail_is_not_resized_in_request(self):
+        """Страница отдаёт заглушку, пока воркер не создал варианты"""
+        cache.clear()
+        post_url = reverse('posts:post_detail', args=(self.post.id,))
+        response = self.authorized_client.get(post_url)
+        self.assertContains(response, 'src="/static/img/placeholder.svg"')
+        self.assertNotContains(response, self.post.image.url)
+        self.assertNotContains(response, 'srcset')
+        self.assertIsNone(thumbnails.cached_variants(self.post.image, 'post'))
+        thumbnails.generate(Post, self.post.pk, 'image',
+                            self.post.image.name, 'post')
+        ready = thumbnails.cached_variants(self.post.image, 'post')
+        self.assertEqual([width for width, _ in ready[None]], [320, 640, 960])
+        response = self.authorized_client.get(post_url)
+        self.assertContains(response, f'src="{dict(ready[None])[960]}"')
+        self.assertContains(response, ' 640w, ')
+        self.assertContains(response, '<source type="image/webp"')
+
+    def test_image_does_not_query_database(self):
+        """Вывод картинки не обращается к БД ни до, ни после генерации"""
+        cache.clear()
+        template = Template("{% load images %}"
+                            "{% responsive_image post.image 'post' %}")
+        context = Context({'post': self.post})
+        with self.assertNumQueries(0):
+            template.render(context)
+        thumbnails.generate(Post, self.post.pk, 'image',
+                            self.post.image.name, 'post')
+        with self.assertNumQueries(0):
+            self.assertIn(' 640w, ', template.render(context))
+
 
 class PaginatorViewsTest(TestCase):
     def setUp(self):
@@ -217,19 +257,49 @@ class PaginatorViewsTest(TestCase):
                     response_2.context.get('page_obj').object_list),
                     posts_difference)
 
+    @override_settings(POSTS_KEYSET_PAGINATION=True)
+    def test_keyset_pages_follow_cursors(self):
+        """Курсорная пагинация проходит ленту без пропусков и повторов"""
+        cache.clear()
+        expected = list(Post.objects.order_by('-pub_date', '-pk'))
+        for reverse_name, arg in self.posts_names:
+            with self.subTest(reverse_name=reverse_name):
+                url = reverse(reverse_name, args=arg)
+                page_obj = self.client.get(url).context['page_obj']
+                self.assertFalse(page_obj.has_previous())
+                self.assertEqual(list(page_obj),
+                                 expected[:settings.POSTS_LIMIT])
+                page_2 = self.client.get(
+                    url, {'cursor': page_obj.next_cursor}
+                ).context['page_obj']
+                self.assertFalse(page_2.has_next())
+                self.assertEqual(list(page_2),
+                                 expected[settings.POSTS_LIMIT:])
+                page_1 = self.client.get(
+                    url, {'cursor': page_2.previous_cursor}
+                ).context['page_obj']
+                self.assertEqual(list(page_1),
+                                 expected[:settings.POSTS_LIMIT])
+
+    def test_keyset_invalid_cursor_returns_first_page(self):
+        """Некорректный курсор возвращает первую страницу"""
+        response = self.client.get(
+            reverse('posts:profile', args=(self.author.username,)),
+            {'cursor': 'garbage'})
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(len(response.context['page_obj']),
+                         settings.POSTS_LIMIT)
 
-class CacheTests(TestCase):
-    @classmethod
-    def setUpClass(cls):
-        super().setUpClass()
-        cls.author = User.objects.create_user(username='test_author')
-        cls.post = Post.objects.create(
-            author=cls.author,
-            text='test_text'
-        )
 
+# Ленты сбрасываются после коммита, поэтому тесты кэша идут без общей
+# транзакции TestCase.
+class CacheTests(TransactionTestCase):
     def setUp(self):
-        self.author = self.post.author
+        self.author = User.objects.create_user(username='test_author')
+        self.post = Post.objects.create(
+            author=self.author,
+            text='test_text'
+        )
         self.authorized_client = Client()
         self.authorized_client.force_login(self.author)
 
@@ -246,12 +316,232 @@ class CacheTests(TestCase):
         self.assertEqual(objects_count_0, post_count + 1)
         self.assertEqual(post_text_0, post_2.text)
         self.assertEqual(post_author_0, post_2.author)
-        Post.objects.filter(id=post_2.id).delete()
+        Post.objects.filter(id=post_2.id).update(text='silent_update')
         response_1 = self.authorized_client.get(reverse('posts:index'))
         self.assertEqual(response_0.content, response_1.content)
         cache.clear()
         response_2 = self.authorized_client.get(reverse('posts:index'))
         self.assertNotEqual(response_0.content, response_2.content)
+        Post.objects.filter(id=post_2.id).delete()
+        response_3 = self.authorized_client.get(reverse('posts:index'))
+        self.assertNotContains(response_3, 'silent_update')
+
+    def test_fragment_hit_skips_page_query(self):
+        """При попадании во фрагмент ленты посты страницы не читаются.
+
+        Фрагмент называется feed без кавычек, как того ждёт тег cache.
+        """
+        cache.clear()
+        urls = (reverse('posts:index'),
+                reverse('posts:profile', args=(self.author.username,)),
+                reverse('posts:follow_index'))
+        for url in urls:
+            with self.subTest(url=url):
+                self.authorized_client.get(url)
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.authorized_client.get(url)
+                self.assertEqual(response.status_code, HTTPStatus.OK)
+                self.assertFalse([
+                    query for query in queries.captured_queries
+                    if 'FROM "posts_post"' in query['sql']
+                    or 'FROM "posts_feeditem"' in query['sql']])
+                fragment_key = make_template_fragment_key('feed', [
+                    response.context['feed_cache_key'], ''])
+                self.assertIsNotNone(cache.get(fragment_key))
+
+    def test_feed_cache_invalidated_by_model_changes(self):
+        """Изменения постов, групп и авторов вне views, например
+        через админку, сразу обновляют закэшированные ленты.
+        """
+        cache.clear()
+        group = Group.objects.create(title='Группа', slug='group')
+        group_url = reverse('posts:group_list', args=(group.slug,))
+        author = User.objects.create_user(username='card_author')
+        post = Post.objects.create(author=author, text='moved_post')
+        self.authorized_client.get(group_url)
+        post.group = group
+        post.save()
+        self.assertContains(self.authorized_client.get(group_url),
+                            'moved_post')
+        group.title = 'Переименованная группа'
+        group.save()
+        self.assertContains(self.authorized_client.get(reverse(
+            'posts:index')), 'Переименованная группа')
+        author.first_name = 'Renamed'
+        author.save()
+        self.assertContains(self.authorized_client.get(reverse(
+            'posts:index')), 'Renamed')
+
+    def test_feed_cache_invalidated_by_post_views(self):
+        """Создание, редактирование и удаление поста через сайт
+        сразу обновляют закэшированные ленты.
+        """
+        cache.clear()
+        group = Group.objects.create(title='Группа', slug='group')
+        urls = (reverse('posts:index'),
+                reverse('posts:profile', args=(self.author.username,)),
+                reverse('posts:group_list', args=(group.slug,)))
+        for url in urls:
+            self.authorized_client.get(url)
+        self.authorized_client.post(reverse('posts:post_create'),
+                                    data={'text': 'fresh_post',
+                                          'group': group.pk})
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertContains(self.authorized_client.get(url),
+                                    'fresh_post')
+        post = Post.objects.get(text='fresh_post')
+        self.authorized_client.post(
+            reverse('posts:post_edit', args=(post.pk,)),
+            data={'text': 'edited_post'})
+        self.assertNotContains(self.authorized_client.get(urls[2]),
+                               'fresh_post')
+        self.assertContains(self.authorized_client.get(urls[0]),
+                            'edited_post')
+        self.authorized_client.get(
+            reverse('posts:post_delete', args=(post.pk,)))
+        self.assertNotContains(self.authorized_client.get(urls[0]),
+                               'edited_post')
+
+    def test_post_and_profile_cards_are_cached(self):
+        """Карточки поста и профиля кэшируются с версией по дате изменения
+        и переиспользуются в разных лентах.
+        """
+        cache.clear()
+        post = Post.objects.get(pk=self.post.pk)
+        card_key = make_template_fragment_key(
+            'post_card', (post.pk, post.updated))
+        self.authorized_client.get(reverse('posts:index'))
+        card = cache.get(card_key)
+        self.assertIn(post.text, card)
+        response = self.authorized_client.get(
+            reverse('posts:profile', args=(self.author.username,)))
+        self.assertContains(response, card)
+        author = response.context['author']
+        self.assertIsNotNone(cache.get(make_template_fragment_key(
+            'profile_card', (author.pk, author.updated, author.posts_count,
+                             author.followers_count))))
+        post.text = 'edited_text'
+        post.save()
+        self.assertContains(
+            self.authorized_client.get(reverse('posts:index')),
+            'edited_text')
+
+    def test_feeds_are_invalidated_after_commit(self):
+        """Версия ленты меняется только после коммита транзакции"""
+        version = get_feed_version(INDEX_FEED)
+        with transaction.atomic():
+            Post.objects.create(author=self.author, text='pending_post')
+            self.assertEqual(get_feed_version(INDEX_FEED), version)
+        self.assertNotEqual(get_feed_version(INDEX_FEED), version)
+
+    def test_cached_feed_keeps_user_chrome(self):
+        """Закэшированная лента не отдаёт шапку одного пользователя другому"""
+        cache.clear()
+        reader = User.objects.create_user(username='other_reader')
+        reader_client = Client()
+        reader_client.force_login(reader)
+        self.authorized_client.get(reverse('posts:index'))
+        response = reader_client.get(reverse('posts:index'))
+        self.assertContains(response, '> other_reader </a>')
+        self.assertNotContains(response, f'> {self.author.username} </a>')
+
+
+class ConditionalGetTests(TransactionTestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username='etag_author')
+        self.reader = User.objects.create_user(username='etag_reader')
+        self.group = Group.objects.create(title='Группа', slug='etag-group')
+        self.post = Post.objects.create(author=self.author, group=self.group,
+                                        text='etag_post')
+        cache.clear()
+        self.client.force_login(self.reader)
+        self.urls = {
+            'index': reverse('posts:index'),
+            'group_list': reverse('posts:group_list',
+                                  args=(self.group.slug,)),
+            'profile': reverse('posts:profile',
+                               args=(self.author.username,)),
+            'post_detail': reverse('posts:post_detail',
+                                   args=(self.post.pk,)),
+        }
+
+    def etags(self, client=None):
+        client = client or self.client
+        return {name: client.get(url)['ETag']
+                for name, url in self.urls.items()}
+
+    def test_unchanged_pages_are_not_rendered_again(self):
+        """Страница с тем же ETag отдаёт 304 без запроса страницы:
+        остаются сессия, пользователь и объект из адреса.
+        """
+        for name, etag in self.etags().items():
+            with self.subTest(page=name):
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.client.get(self.urls[name],
+                                               HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code,
+                                 HTTPStatus.NOT_MODIFIED)
+                self.assertEqual(response.content, b'')
+                self.assertLessEqual(len(queries), 3)
+                self.assertIn('no-cache', response['Cache-Control'])
+
+    def test_changes_update_etags(self):
+        """Новый пост, комментарий и подписка меняют ETag своих страниц"""
+        before = self.etags()
+        Post.objects.create(author=self.author, group=self.group,
+                            text='another_post')
+        after_post = self.etags()
+        for name in before:
+            with self.subTest(page=name, change='post'):
+                self.assertNotEqual(before[name], after_post[name])
+        Comment.objects.create(post=self.post, author=self.reader,
+                               text='etag_comment')
+        self.assertNotEqual(self.etags()['post_detail'],
+                            after_post['post_detail'])
+        before = self.etags()
+        follower = User.objects.create_user(username='etag_follower')
+        Follow.objects.create(user=follower, author=self.author)
+        after_follow = self.etags()
+        self.assertNotEqual(before['profile'], after_follow['profile'])
+        self.assertEqual(before['index'], after_follow['index'])
+
+    def test_etag_depends_on_viewer(self):
+        """Разные пользователи и гость получают разные ETag"""
+        author_client = Client()
+        author_client.force_login(self.author)
+        reader, author, guest = (self.etags(), self.etags(author_client),
+                                 self.etags(Client()))
+        for name in self.urls:
+            with self.subTest(page=name):
+                self.assertEqual(len({reader[name], author[name],
+                                      guest[name]}), 3)
+
+    def test_ready_avatar_thumbnails_update_etags(self):
+        """Готовые миниатюры аватарки меняют ETag страниц с её карточкой"""
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        media = override_settings(MEDIA_ROOT=media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+        avatar = BytesIO()
+        Image.new('RGB', (200, 160), 'red').save(avatar, 'PNG')
+        self.author.avatar = SimpleUploadedFile('avatar.png',
+                                                avatar.getvalue())
+        self.author.save()
+        before = self.etags()
+        response = self.client.get(self.urls['profile'],
+                                   HTTP_IF_NONE_MATCH=before['profile'])
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+        thumbnails.generate(User, self.author.pk, 'avatar',
+                            self.author.avatar.name, 'avatar')
+        for name in ('profile', 'post_detail'):
+            with self.subTest(page=name):
+                response = self.client.get(self.urls[name],
+                                           HTTP_IF_NONE_MATCH=before[name])
+                self.assertEqual(response.status_code, HTTPStatus.OK)
+                self.assertNotEqual(response['ETag'], before[name])
+                self.assertContains(response, 'srcset=')
 
 
 class FollowViewsTests(TestCase):
@@ -318,6 +608,50 @@ class FollowViewsTests(TestCase):
         self.assertEqual(objects_count_follow_2, 2)
         self.assertEqual(objects_count, 0)
 
+    def test_follow_feed_is_materialized(self):
+        """Подписка и новые посты раскладываются в ленту читателя,
+        отписка убирает из неё посты автора.
+        """
+        self.authorized_client.get(
+            reverse('posts:profile_follow', args=(self.author.username,)))
+        post_2 = Post.objects.create(author=self.author, text='test_text_2')
+        self.assertEqual(
+            list(self.user.feed_items.values_list('post', flat=True)),
+            [post_2.pk, self.post.pk])
+        response = self.authorized_client.get(reverse('posts:follow_index'))
+        self.assertEqual(list(response.context['page_obj']),
+                         [post_2, self.post])
+        self.authorized_client.get(
+            reverse('posts:profile_unfollow', args=(self.author.username,)))
+        self.assertFalse(self.user.feed_items.exists())
+
+    @override_settings(FEED_FANOUT_LIMIT=2)
+    def test_follow_feed_reads_heavy_authors_on_demand(self):
+        """Посты авторов с большим числом подписчиков
+        читаются в ленту без раскладки.
+        """
+        Follow.objects.create(user=self.user, author=self.author)
+        Follow.objects.create(user=self.follower_user, author=self.author)
+        post_2 = Post.objects.create(author=self.author, text='test_text_2')
+        self.assertFalse(post_2.feed_items.exists())
+        response = self.authorized_client.get(reverse('posts:follow_index'))
+        self.assertEqual(list(response.context['page_obj']),
+                         [post_2, self.post])
+
+    @override_settings(FEED_FANOUT_LIMIT=2)
+    def test_posts_of_heavy_author_stay_after_unfollows(self):
+        """Когда у автора становится меньше FEED_FANOUT_LIMIT подписчиков,
+        его посты без раскладки дописываются в ленты.
+        """
+        Follow.objects.create(user=self.user, author=self.author)
+        Follow.objects.create(user=self.follower_user, author=self.author)
+        post_2 = Post.objects.create(author=self.author, text='test_text_2')
+        Follow.objects.filter(user=self.follower_user).delete()
+        self.assertTrue(post_2.feed_items.filter(user=self.user).exists())
+        response = self.authorized_client.get(reverse('posts:follow_index'))
+        self.assertEqual(list(response.context['page_obj']),
+                         [post_2, self.post])
+
 
 class CommentViewsTests(TestCase):
     @classmethod
@@ -430,3 +764,102 @@ class CommentViewsTests(TestCase):
         self.assertNotEqual(edited_comment_1.text, 'edited_comment_1')
         self.assertRedirects(response_1, reverse(
             'posts:post_detail', args=(self.post.id,)))
+
+    def post_detail_queries(self):
+        url = reverse('posts:post_detail', args=(self.post.id,))
+        with CaptureQueriesContext(connection) as queries:
+            self.authorized_client.get(url)
+        return len(queries)
+
+    def test_post_detail_queries_do_not_grow_with_comments(self):
+        """Число запросов post_detail не зависит от числа комментариев"""
+        comment = Comment.objects.create(post=self.post, author=self.user,
+                                         text='test_comment')
+        expected = self.post_detail_queries()
+        for number in range(5):
+            parent = Comment.objects.create(
+                post=self.post, author=self.user_2, text=f'comment {number}')
+            Comment.objects.create(post=self.post, author=self.user,
+                                   text=f'reply {number}', parent=parent)
+            Comment.objects.create(post=self.post, author=self.user_2,
+                                   text=f'reply {number}', parent=comment)
+        self.assertEqual(self.post_detail_queries(), expected)
+
+    @override_settings(COMMENTS_LIMIT=2)
+    def test_post_detail_ships_first_threads_without_replies(self):
+        """post_detail отдаёт первые ветки без ответов,
+        ответы приходят отдельным запросом.
+        """
+        threads = [
+            Comment.objects.create(post=self.post, author=self.user,
+                                   text=f'comment {number}')
+            for number in range(3)
+        ]
+        Comment.objects.create(post=self.post, author=self.user_2,
+                               text='hidden reply', parent=threads[0])
+        url = reverse('posts:post_detail', args=(self.post.id,))
+        response = self.client.get(url)
+        self.assertEqual(len(response.context['comments']), 2)
+        self.assertNotContains(response, 'hidden reply')
+        response = self.client.get(url, {'comments_page': 2})
+        self.assertEqual(len(response.context['comments']), 1)
+        replies_url = reverse('posts:comment_replies', args=(threads[0].id,))
+        self.assertContains(self.client.get(replies_url), 'hidden reply')
+        replies = self.client.get(replies_url, {'format': 'json'}).json()
+        self.assertEqual([reply['text'] for reply in replies['replies']],
+                         ['hidden reply'])
+
+
+class SearchViewTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.other = User.objects.create_user(username='other')
+        cls.group = Group.objects.create(title='Группа', slug='group')
+        cls.exact = Post.objects.create(
+            author=cls.author, group=cls.group,
+            text='Кошки. Про кошек и кошку: кошки повсюду')
+        cls.mention = Post.objects.create(
+            author=cls.other, text='Собаки лучше, чем кошки')
+        Post.objects.create(author=cls.author, text='Совсем про другое')
+
+    def search(self, **params):
+        response = self.client.get(reverse('posts:search'), params)
+        return list(response.context['page_obj'])
+
+    def test_search_ranks_matches(self):
+        """Поиск находит словоформы и ставит релевантные посты выше"""
+        self.assertEqual(self.search(q='кошк'), [self.exact, self.mention])
+        self.assertEqual(self.search(q='Собаки кошки'), [self.mention])
+        self.assertEqual(self.search(q='"'), [])
+
+    def test_search_filters_by_group_and_author(self):
+        """Результаты поиска фильтруются по группе и автору"""
+        self.assertEqual(self.search(q='кошки', group=self.group.slug),
+                         [self.exact])
+        self.assertEqual(self.search(q='кошки', author=self.other.username),
+                         [self.mention])
+
+    def test_search_index_follows_post_changes(self):
+        """Индекс обновляется при изменении и удалении поста"""
+        post = Post.objects.get(pk=self.mention.pk)
+        post.text = 'Только собаки'
+        post.save()
+        self.assertEqual(self.search(q='кошки'), [self.exact])
+        self.assertEqual(self.search(q='собаки'), [post])
+        post.delete()
+        self.assertEqual(self.search(q='собаки'), [])
+
+    def test_admin_search_uses_index(self):
+        """Поиск в админке идёт через полнотекстовый индекс"""
+        admin = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='pass')
+        self.client.force_login(admin)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(
+                reverse('admin:posts_post_changelist'), {'q': 'собаки'})
+        self.assertEqual(list(response.context['cl'].result_list),
+                         [self.mention])
+        self.assertTrue(any(' MATCH ' in query['sql']
+                            for query in queries.captured_queries))
@@ -0,0 +1,156 @@
+"""Миниатюры картинок, которые готовит фоновый пул потоков.
+
+Каждая картинка нарезается в несколько ширин и форматов для srcset.
+Страницы не ресайзят картинки сами: responsive_image берёт из кэша
+список готовых вариантов, а пока его нет — отдаёт заглушку и ставит
+генерацию в очередь.
+"""
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from PIL import Image
+from sorl.thumbnail import default, get_thumbnail
+from sorl.thumbnail.base import EXTENSIONS
+from sorl.thumbnail.images import ImageFile
+
+from .metrics import THUMBNAIL_SECONDS
+
+logger = logging.getLogger(__name__)
+
+SIZES = {
+    'post': {
+        'geometry': (960, 339),
+        'widths': (320, 640, 960, 1440),
+        'sizes': '(max-width: 992px) 100vw, 960px',
+    },
+    'avatar': {
+        'geometry': (180, 150),
+        'widths': (90, 180, 360),
+        'sizes': '180px',
+    },
+}
+OPTIONS = {'crop': 'center', 'upscale': True}
+Image.init()
+MODERN_FORMATS = tuple(
+    image_format for image_format in ('AVIF', 'WEBP')
+    if image_format in EXTENSIONS and image_format in Image.SAVE)
+MIME_TYPES = {'AVIF': 'image/avif', 'WEBP': 'image/webp'}
+
+_lock = threading.Lock()
+_pending = set()
+_executor = None
+_executor_pid = None
+
+
+def _get_executor():
+    global _executor, _executor_pid
+    with _lock:
+        if _executor_pid != os.getpid():
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.THUMBNAIL_WORKERS,
+                thread_name_prefix='thumbnails')
+            _executor_pid = os.getpid()
+        return _executor
+
+
+def variants(size, source_width):
+    """Пары (ширина, формат); формат None — формат sorl по умолчанию.
+
+    Ширины больше исходной картинки, кроме основной, пропускаются.
+    """
+    max_width = max(SIZES[size]['geometry'][0], source_width)
+    for width in SIZES[size]['widths']:
+        if width > max_width:
+            break
+        for image_format in (None, *MODERN_FORMATS):
+            yield width, image_format
+
+
+def _geometry(size, width):
+    base_width, base_height = SIZES[size]['geometry']
+    return f'{width}x{round(width * base_height / base_width)}'
+
+
+def _options(image_format):
+    if image_format is None:
+        return dict(OPTIONS)
+    return {**OPTIONS, 'format': image_format}
+
+
+def _variants_key(name, size):
+    return f'thumbnails:{size}:{ImageFile(name).key}'
+
+
+def cached_variants(image, size):
+    """Готовые варианты картинки или None, пока generate их не создал.
+
+    Варианты — {формат: [(ширина, url), ...]}; сама картинка при этом
+    не открывается.
+    """
+    if not image:
+        return None
+    return cache.get(_variants_key(image.name, size))
+
+
+def generate(model, pk, field, name, size):
+    """Создаёт варианты картинки и обновляет её владельца.
+
+    Набор вариантов сохраняется в кэш одной записью, так что страница
+    тратит на картинку одно обращение к кэшу и ни одного к БД.
+    """
+    base_width = SIZES[size]['geometry'][0]
+    get_thumbnail(name, _geometry(size, base_width), **OPTIONS)
+    source = default.kvstore.get(ImageFile(name))
+    if source is None:
+        return
+    ready = {}
+    for width, image_format in variants(size, source.width):
+        thumbnail = get_thumbnail(name, _geometry(size, width),
+                                  **_options(image_format))
+        ready.setdefault(image_format, []).append((width, thumbnail.url))
+    cache.set(_variants_key(name, size), ready, None)
+    instance = model.objects.filter(pk=pk).first()
+    if instance is not None and getattr(instance, field).name == name:
+        instance.save(update_fields=['updated'])
+
+
+def _run(model, pk, field, name, size):
+    started = time.perf_counter()
+    try:
+        generate(model, pk, field, name, size)
+        THUMBNAIL_SECONDS.observe(time.perf_counter() - started, size=size)
+    except Exception:
+        logger.exception('Не удалось создать миниатюру %s', name)
+    finally:
+        with _lock:
+            _pending.discard((name, size))
+        connection.close()
+
+
+def _submit(model, pk, field, name, size):
+    with _lock:
+        if (name, size) in _pending:
+            return
+        _pending.add((name, size))
+    _get_executor().submit(_run, model, pk, field, name, size)
+
+
+def schedule(image, size):
+    """Ставит генерацию миниатюры в очередь после коммита транзакции.
+
+    Когда миниатюра готова, у владельца картинки обновляется поле
+    updated, поэтому закэшированные карточки перерисовываются.
+    При THUMBNAIL_WORKERS = 0 фоновая генерация выключена, миниатюры
+    создаёт команда generate_thumbnails.
+    """
+    if not image or not settings.THUMBNAIL_WORKERS:
+        return
+    instance = image.instance
+    args = (type(instance), instance.pk, image.field.attname, image.name, size)
+    transaction.on_commit(lambda: _submit(*args))
@@ -0,0 +1,135 @@
+"""Приём картинок из форм.
+
+Загрузки пишутся на диск по частям; всё сверх UPLOAD_MAX_SIZE
+отбрасывается, а форма показывает ошибку. Размер тела запроса целиком
+ограничивает прокси перед приложением.
+Размеры картинки проверяются по заголовку до полного декодирования,
+а в хранилище попадает нормализованная мастер-копия: уменьшенная до
+IMAGE_MASTER_SIZE, повёрнутая по EXIF и без метаданных.
+"""
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile, UploadedFile
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from django.template.defaultfilters import filesizeformat
+from PIL import Image, ImageOps
+
+SAVE_OPTIONS = {
+    'JPEG': {'quality': 85, 'optimize': True, 'progressive': True},
+    'PNG': {'optimize': True},
+    'GIF': {},
+    'WEBP': {'quality': 85},
+}
+
+
+class LimitedUploadHandler(TemporaryFileUploadHandler):
+    """Пишет загрузку во временный файл и отбрасывает всё после лимита.
+
+    Разбор запроса не обрывается: поля после файла тоже дойдут до формы,
+    и она покажет ошибку, а не соединение, сброшенное посреди запроса.
+    """
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.received = 0
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received <= settings.UPLOAD_MAX_SIZE:
+            self.file.write(raw_data)
+
+    def file_complete(self, file_size):
+        file = super().file_complete(file_size)
+        file.too_large = self.received > settings.UPLOAD_MAX_SIZE
+        return file
+
+
+def normalize_image(file):
+    """Мастер-копия картинки; анимации сохраняются как есть."""
+    file.seek(0)
+    with Image.open(file) as image:
+        if getattr(image, 'is_animated', False):
+            file.seek(0)
+            return file
+        image_format = image.format
+        if image_format not in SAVE_OPTIONS:
+            image_format = 'JPEG'
+        limit = settings.IMAGE_MASTER_SIZE
+        if image.format == 'JPEG':
+            image.draft(None, (limit, limit))
+        options = dict(SAVE_OPTIONS[image_format])
+        if image.info.get('icc_profile'):
+            options['icc_profile'] = image.info['icc_profile']
+        if 'transparency' in image.info and image_format != 'JPEG':
+            options['transparency'] = image.info['transparency']
+        master = ImageOps.exif_transpose(image)
+        master.thumbnail((limit, limit), Image.LANCZOS)
+        if image_format == 'JPEG' and master.mode not in ('RGB', 'L'):
+            master = master.convert('RGB')
+        output = BytesIO()
+        master.save(output, image_format, **options)
+    name = file.name
+    if image_format != image.format:
+        name = os.path.splitext(name)[0] + '.jpg'
+    return SimpleUploadedFile(name, output.getvalue(),
+                              content_type=Image.MIME[image_format])
+
+
+def clean_master_image(file):
+    """Проверяет новую загрузку и возвращает её мастер-копию.
+
+    Уже сохранённые файлы возвращаются без изменений.
+    """
+    if not isinstance(file, UploadedFile):
+        return file
+    if file.size > settings.UPLOAD_MAX_SIZE:
+        raise too_large_error()
+    file.seek(0)
+    with Image.open(file) as image:
+        width, height = image.size
+    if width * height > settings.IMAGE_MAX_PIXELS:
+        raise ValidationError(
+            'Картинка больше %(limit)s мегапикселей.',
+            code='too_many_pixels',
+            params={'limit': settings.IMAGE_MAX_PIXELS // 10 ** 6})
+    return normalize_image(file)
+
+
+def too_large_error():
+    return ValidationError(
+        'Файл больше %(limit)s.', code='too_large',
+        params={'limit': filesizeformat(settings.UPLOAD_MAX_SIZE)})
+
+
+class MasterImagesMixin:
+    """Пропускает картинки из image_fields через clean_master_image.
+
+    Обрезанные LimitedUploadHandler загрузки убираются из files ещё до
+    проверки полей, чтобы ImageField не пытался их открыть.
+    """
+    image_fields = ()
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.too_large = [name for name in self.image_fields
+                          if getattr(self.files.get(name), 'too_large', False)]
+        if self.too_large:
+            self.files = self.files.copy()
+            for name in self.too_large:
+                del self.files[name]
+
+    def clean(self):
+        cleaned_data = super().clean()
+        for name in self.image_fields:
+            try:
+                if name in self.too_large:
+                    raise too_large_error()
+                if name in cleaned_data:
+                    cleaned_data[name] = clean_master_image(
+                        cleaned_data[name])
+            except ValidationError as error:
+                self.add_error(name, error)
+        return cleaned_data
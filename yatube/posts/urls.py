@@ -18,10 +18,13 @@ urlpatterns = [
          name='add_comment'),
     path('posts/comment/<int:comment_id>/reply/', views.add_child_comment,
          name='add_child_comment'),
+    path('posts/comment/<int:comment_id>/replies/', views.comment_replies,
+         name='comment_replies'),
     path('posts/comment/<int:comment_id>/delete/', views.delete_comment,
          name='delete_comment'),
     path('posts/comment/<int:comment_id>/edit/', views.edit_comment,
          name='edit_comment'),
+    path('search/', views.search, name='search'),
     path('follow/', views.follow_index, name='follow_index'),
     path('profile/<str:username>/follow/', views.profile_follow,
          name='profile_follow'),
@@ -1,8 +1,138 @@
+from collections.abc import Sequence
+from functools import partial
+
 from django.conf import settings
-from django.core.paginator import Paginator
+from django.core.paginator import Page, Paginator
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django.utils.encoding import force_bytes, force_text
+from django.utils.functional import SimpleLazyObject, cached_property
+from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
+
+NEXT = 'n'
+PREVIOUS = 'p'
+
+
+def encode_cursor(direction, post):
+    value = f'{direction}|{post.pub_date.isoformat()}|{post.pk}'
+    return urlsafe_base64_encode(force_bytes(value))
+
+
+def decode_cursor(token):
+    try:
+        direction, pub_date, pk = force_text(
+            urlsafe_base64_decode(token)).split('|')
+        pub_date = parse_datetime(pub_date)
+        pk = int(pk)
+    except (TypeError, ValueError, UnicodeDecodeError):
+        return None
+    if direction not in (NEXT, PREVIOUS) or pub_date is None:
+        return None
+    return direction, pub_date, pk
+
+
+class KeysetPage(Sequence):
+    """Страница по ключу; строки читаются при первом обращении к ней."""
+
+    def __init__(self, load):
+        self._load = load
+
+    @cached_property
+    def _loaded(self):
+        return self._load()
+
+    @property
+    def object_list(self):
+        return self._loaded[0]
+
+    @property
+    def next_cursor(self):
+        return self._loaded[1]
+
+    @property
+    def previous_cursor(self):
+        return self._loaded[2]
+
+    def __repr__(self):
+        return f'<Keyset page of {len(self.object_list)} objects>'
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class KeysetPaginator:
+    """Постраничный вывод по ключу (pub_date, pk) без COUNT и OFFSET."""
+
+    def __init__(self, object_list, per_page):
+        self.object_list = object_list.order_by('-pub_date', '-pk')
+        self.per_page = int(per_page)
+
+    def get_page(self, token, transform=None):
+        cursor = decode_cursor(token) if token else None
+        if cursor is None:
+            return KeysetPage(partial(self._page, self.object_list, NEXT,
+                                      transform, first=True))
+        direction, pub_date, pk = cursor
+        if direction == NEXT:
+            posts = self.object_list.filter(
+                Q(pub_date__lt=pub_date) | Q(pub_date=pub_date, pk__lt=pk))
+        else:
+            posts = self.object_list.filter(
+                Q(pub_date__gt=pub_date) | Q(pub_date=pub_date, pk__gt=pk)
+            ).reverse()
+        return KeysetPage(partial(self._page, posts, direction, transform))
+
+    def _page(self, posts, direction, transform, first=False):
+        posts = list(posts[:self.per_page + 1])
+        has_more = len(posts) > self.per_page
+        posts = posts[:self.per_page]
+        if direction == PREVIOUS:
+            posts.reverse()
+            has_next, has_previous = True, has_more
+        else:
+            has_next, has_previous = has_more, not first
+        if not posts:
+            return posts, None, None
+        return (
+            transform(posts) if transform else posts,
+            encode_cursor(NEXT, posts[-1]) if has_next else None,
+            encode_cursor(PREVIOUS, posts[0]) if has_previous else None,
+        )
+
 
+def get_page_obj(request, posts, keyset=False, transform=None):
+    """Страница posts по параметрам запроса.
 
-def get_page_obj(request, posts):
+    Запросы к базе выполняются при первом обращении к странице, так что
+    при попадании во фрагмент ленты их нет вовсе; для этого первая
+    страница строится без COUNT. transform получает список строк
+    страницы и возвращает то, что в ней будет показано.
+    """
+    cursor = request.GET.get('cursor')
+    if keyset and (cursor or settings.POSTS_KEYSET_PAGINATION
+                   and 'page' not in request.GET):
+        return KeysetPaginator(posts, settings.POSTS_LIMIT).get_page(
+            cursor, transform)
     paginator = Paginator(posts, settings.POSTS_LIMIT)
     page_number = request.GET.get('page')
-    return paginator.get_page(page_number)
+    if page_number is None:
+        page_obj = Page(posts[:paginator.per_page], 1, paginator)
+    else:
+        page_obj = paginator.get_page(page_number)
+    if transform:
+        rows = page_obj.object_list
+        page_obj.object_list = SimpleLazyObject(
+            lambda: transform(list(rows)))
+    return page_obj
@@ -1,43 +1,104 @@
 from django.contrib.auth.decorators import login_required, permission_required
+from django.db import transaction
+from django.http import JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render
-from django.views.decorators.cache import cache_page
+from django.views.decorators.cache import cache_control
 
+from core.db.replicas import replica_reads
+
+from .caching import (INDEX_FEED, feed_cache_context, feed_etag, follow_feed,
+                      group_feed, not_modified, post_scope, profile_feed)
+from .comments import get_comment_or_404, get_comment_page, get_replies
+from .feeds import get_follow_page, heavy_authors
 from .forms import (CommentForm, EditGroupsForm,
-                    EditProfileForm, PostForm)
-from .models import Comment, Follow, Group, Post, User
+                    EditProfileForm, PostForm, SearchForm)
+from .models import Follow, Group, Post, User
+from .search import search_posts
+from .signals import delete_with_cascade
 from .utils import get_page_obj
 
 
-@cache_page(20)
+# Страницы лент отдают 304, пока не изменились версии их лент: браузер
+# перепроверяет страницу при каждом переходе, а сервер не выполняет
+# запрос страницы и не рендерит шаблон.
+@replica_reads
+@cache_control(private=True, no_cache=True)
 def index(request):
+    etag = feed_etag(request, INDEX_FEED)
+    response = not_modified(request, etag)
+    if response:
+        return response
     posts = Post.objects.select_related('author', 'group').all()
     context = {
-        'page_obj': get_page_obj(request, posts),
+        'page_obj': get_page_obj(request, posts, keyset=True),
+        **feed_cache_context(INDEX_FEED),
     }
-    return render(request, 'posts/index.html', context)
+    response = render(request, 'posts/index.html', context)
+    response['ETag'] = etag
+    return response
 
 
+@replica_reads
+@cache_control(private=True, no_cache=True)
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
+    etag = feed_etag(request, group_feed(group.pk))
+    response = not_modified(request, etag)
+    if response:
+        return response
     posts = group.posts.select_related('author').all()
     context = {
         'group': group,
-        'page_obj': get_page_obj(request, posts),
+        'page_obj': get_page_obj(request, posts, keyset=True),
+        **feed_cache_context(group_feed(group.pk)),
     }
-    return render(request, 'posts/group_list.html', context)
+    response = render(request, 'posts/group_list.html', context)
+    response['ETag'] = etag
+    return response
 
 
+@replica_reads
+@cache_control(private=True, no_cache=True)
 def profile(request, username):
     author = get_object_or_404(User, username=username)
+    etag = feed_etag(request, profile_feed(author.pk))
+    response = not_modified(request, etag)
+    if response:
+        return response
     posts = author.posts.select_related('group')
     following = request.user.is_authenticated and (Follow.objects.filter(
         user=request.user, author=author).exists())
     context = {
         'author': author,
-        'page_obj': get_page_obj(request, posts),
+        'page_obj': get_page_obj(request, posts, keyset=True),
         'following': following,
+        **feed_cache_context(profile_feed(author.pk)),
     }
-    return render(request, 'posts/profile.html', context)
+    response = render(request, 'posts/profile.html', context)
+    response['ETag'] = etag
+    return response
+
+
+@replica_reads
+def search(request):
+    form = SearchForm(request.GET or None)
+    posts = Post.objects.none()
+    if form.is_valid():
+        posts = Post.objects.select_related('author', 'group')
+        if form.cleaned_data['group']:
+            posts = posts.filter(group=form.cleaned_data['group'])
+        if form.cleaned_data['author']:
+            posts = posts.filter(
+                author__username=form.cleaned_data['author'])
+        posts = search_posts(form.cleaned_data['q'], posts)
+    query = request.GET.copy()
+    query.pop('page', None)
+    context = {
+        'form': form,
+        'page_obj': get_page_obj(request, posts),
+        'page_query': f'{query.urlencode()}&' if query else '',
+    }
+    return render(request, 'posts/search.html', context)
 
 
 @login_required
@@ -53,22 +114,37 @@ def edit_profile(request, username):
     return redirect('posts:profile', author.username)
 
 
-def post_detail(request, post_id):
-    post = get_object_or_404(Post, pk=post_id)
-    form = CommentForm(request.POST or None)
-    author = post.author
+def get_post_detail_context(request, post, form, comment=None):
     following = request.user.is_authenticated and (Follow.objects.filter(
-        user=request.user, author=author).exists())
-    context = {
+        user=request.user, author=post.author).exists())
+    return {
         'post': post,
         'form': form,
-        'comments': post.comments.all(),
+        'comments': get_comment_page(request, post),
+        'comment': comment,
         'following': following,
     }
-    return render(request, 'posts/post_detail.html', context)
+
+
+@replica_reads
+@cache_control(private=True, no_cache=True)
+def post_detail(request, post_id):
+    post = get_object_or_404(
+        Post.objects.select_related('author', 'group'), pk=post_id)
+    etag = feed_etag(request, post_scope(post.pk),
+                     profile_feed(post.author_id))
+    response = not_modified(request, etag)
+    if response:
+        return response
+    form = CommentForm(request.POST or None)
+    context = get_post_detail_context(request, post, form)
+    response = render(request, 'posts/post_detail.html', context)
+    response['ETag'] = etag
+    return response
 
 
 @login_required
+@transaction.atomic
 def post_create(request):
     form = PostForm(request.POST or None, files=request.FILES or None)
     if request.method == 'GET' or not form.is_valid():
@@ -93,15 +169,17 @@ def post_edit(request, post_id):
 
 
 @login_required
+@transaction.atomic
 def post_delete(request, post_id):
     post = get_object_or_404(Post, id=post_id)
     if post.author != request.user:
         return redirect('posts:post_detail', post_id)
-    post.delete()
+    delete_with_cascade(post)
     return redirect('posts:profile', request.user)
 
 
 @login_required
+@transaction.atomic
 def add_comment(request, post_id):
     post = get_object_or_404(Post, id=post_id)
     form = CommentForm(request.POST or None)
@@ -114,21 +192,16 @@ def add_comment(request, post_id):
 
 
 @login_required
+@transaction.atomic
 def add_child_comment(request, comment_id):
-    comment = get_object_or_404(Comment, id=comment_id)
+    comment = get_comment_or_404(comment_id)
     form = CommentForm(request.POST or None)
-    if comment.parent:
+    if comment.parent_id:
         return redirect('posts:post_detail', comment.post.id)
     if not form.is_valid():
-        comments = Comment.objects.filter(post_id=comment.post.id)
-        context = {
-            'post': comment.post,
-            'form': form,
-            'comments': comments,
-            'comment': comment,
-        }
-        return render(request, 'posts/post_detail.html',
-                      context)
+        context = get_post_detail_context(request, comment.post, form,
+                                          comment)
+        return render(request, 'posts/post_detail.html', context)
     child_comment = form.save(commit=False)
     child_comment.post = comment.post
     child_comment.author = request.user
@@ -138,42 +211,59 @@ def add_child_comment(request, comment_id):
 
 
 @login_required
+@transaction.atomic
 def delete_comment(request, comment_id):
-    comment = get_object_or_404(Comment, id=comment_id)
+    comment = get_comment_or_404(comment_id)
     if request.user in [comment.author, comment.post.author]:
-        comment.delete()
+        delete_with_cascade(comment)
     return redirect('posts:post_detail', post_id=comment.post.id)
 
 
+def comment_replies(request, comment_id):
+    comment = get_comment_or_404(comment_id)
+    replies = get_replies(comment)
+    if request.GET.get('format') == 'json':
+        return JsonResponse({'replies': [{
+            'id': reply.pk,
+            'author': reply.author.username,
+            'text': reply.text,
+            'created': reply.created,
+        } for reply in replies]})
+    context = {
+        'post': comment.post,
+        'replies': replies,
+    }
+    return render(request, 'posts/includes/comment_replies.html', context)
+
+
 @login_required
 def edit_comment(request, comment_id):
-    comment = get_object_or_404(Comment, id=comment_id)
+    comment = get_comment_or_404(comment_id)
     if request.user != comment.author:
         return redirect('posts:post_detail', comment.post.id)
     form = CommentForm(request.POST or None, instance=comment)
     if not form.is_valid():
-        comments = Comment.objects.filter(post_id=comment.post.id)
-        context = {
-            'post': comment.post,
-            'form': form,
-            'comments': comments,
-            'comment': comment,
-        }
+        context = get_post_detail_context(request, comment.post, form,
+                                          comment)
         return render(request, 'posts/post_detail.html', context)
     form.save()
     return redirect('posts:post_detail', comment.post.id)
 
 
 @login_required
+@replica_reads
 def follow_index(request):
-    posts = Post.objects.filter(author__following__user=request.user)
+    heavy = list(heavy_authors(request.user))
     context = {
-        'page_obj': get_page_obj(request, posts),
+        'page_obj': get_follow_page(request, heavy),
+        **feed_cache_context(follow_feed(request.user.pk),
+                             *map(profile_feed, heavy)),
     }
     return render(request, 'posts/follow.html', context)
 
 
 @login_required
+@transaction.atomic
 def profile_follow(request, username):
     author = get_object_or_404(User, username=username)
     if author != request.user:
@@ -182,6 +272,7 @@ def profile_follow(request, username):
 
 
 @login_required
+@transaction.atomic
 def profile_unfollow(request, username):
     Follow.objects.filter(
         user=request.user, author__username=username).delete()
@@ -223,5 +314,5 @@ def groups_edit(request, group_id):
                      raise_exception=PermissionError)
 def groups_delete(request, group_id):
     group = get_object_or_404(Group, id=group_id)
-    group.delete()
+    delete_with_cascade(group)
     return redirect('posts:groups_index')
@@ -1,12 +1,16 @@
 $(function(){
-    $(".toggle-btn").click(function(event) {
+    $(document).on("click", ".toggle-btn", function(event) {
         event.preventDefault();
-        $(this).closest('.main-div').find('.children').toggle();
-        if ($(this).closest('.main-div').find('.children').css('display') === 'none'){
-            $(this).text('показать ответы');
+        var button = $(this);
+        var children = button.closest('.main-div').find('.children').first();
+        if (!button.data('loaded')) {
+            button.data('loaded', true);
+            children.load(button.data('url'));
         }
-        else ($(this).text('скрыть ответы'));
+        children.toggle();
+        if (children.css('display') === 'none'){
+            button.text('показать ответы');
+        }
+        else (button.text('скрыть ответы'));
     });
 });
-
-
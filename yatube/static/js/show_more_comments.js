@@ -1,19 +1,15 @@
-$(document).ready(function() {
-  var list = $(".main-div");
-  var numToShow = 10;
-  var button = $(".button-show-more");
-  var numInList = list.length;
-  list.hide();
-  if (numInList <= numToShow) {
-    button.hide();
-  }
-  list.slice(0, numToShow).show();
-  button.click(function() {
-    var showing = list.filter(':visible').length;
-    list.slice(showing - 1, showing + numToShow).fadeIn();
-    var lastComment = list.last();
-    if (lastComment.css("display") === "block") {
-      button.hide();
-    }
+$(function() {
+  $(document).on("click", ".button-show-more", function(event) {
+    event.preventDefault();
+    var button = $(this);
+    $.get(button.attr('href'), function(html) {
+      var page = $('<div>').append($.parseHTML(html));
+      $('#comments').append(page.find('#comments').children());
+      var next = page.find('.button-show-more');
+      if (next.length) {
+        button.attr('href', next.attr('href'));
+      }
+      else (button.remove());
+    });
   });
 });
@@ -1,10 +1,25 @@
 import os
+import sys
+import tempfile
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
-SECRET_KEY = 'gzjukd@0z4sxs79v*+f76^b716*36#^&&5m8*@e3%9g*865g=j'
+# manage.py test и pytest пишут кэш и метрики во временный каталог
+# запуска, а не в файлы рабочего сервера.
+TESTING = sys.argv[1:2] == ['test'] or 'pytest' in sys.modules
+TEST_DIR = os.path.join(tempfile.gettempdir(), f'yatube-tests-{os.getpid()}')
 
-DEBUG = True
+# development или production; production выключает отладочные компоненты
+# и рассчитан на работу за прокси, который отдаёт статику и медиафайлы.
+DJANGO_ENV = os.getenv('DJANGO_ENV', 'development')
+PRODUCTION = DJANGO_ENV == 'production'
+
+# Ключ только для разработки: в production SECRET_KEY задаётся
+# переменной окружения, иначе приложение не запустится (core.E001).
+DEVELOPMENT_SECRET_KEY = 'gzjukd@0z4sxs79v*+f76^b716*36#^&&5m8*@e3%9g*865g=j'
+SECRET_KEY = os.getenv('SECRET_KEY', DEVELOPMENT_SECRET_KEY)
+
+DEBUG = os.getenv('DEBUG', '0' if PRODUCTION else '1') == '1'
 
 ALLOWED_HOSTS = [
     'localhost',
@@ -13,6 +28,7 @@ ALLOWED_HOSTS = [
     'testserver',
     'www.ghoulNEC.pythonanywhere.com',
     'ghoulNEC.pythonanywhere.com',
+    *filter(None, os.getenv('ALLOWED_HOSTS', '').split(',')),
 ]
 
 INSTALLED_APPS = [
@@ -27,33 +43,48 @@ INSTALLED_APPS = [
     'django.contrib.messages',
     'django.contrib.staticfiles',
     'sorl.thumbnail',
-    'debug_toolbar',
     'mptt',
 ]
 
 MIDDLEWARE = [
+    'core.profiling.ProfilingMiddleware',
+    'core.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.db.replicas.PinPrimaryMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
-    'debug_toolbar.middleware.DebugToolbarMiddleware',
 ]
 
+if DEBUG and not PRODUCTION:
+    INSTALLED_APPS.append('debug_toolbar')
+    MIDDLEWARE.append('debug_toolbar.middleware.DebugToolbarMiddleware')
+
 INTERNAL_IPS = [
     '127.0.0.1',
 ]
 
 ROOT_URLCONF = 'yatube.urls'
 TEMPLATES_DIR = os.path.join(BASE_DIR, 'templates')
+TEMPLATE_CACHE = os.getenv('TEMPLATE_CACHE', '0' if DEBUG else '1') == '1'
+TEMPLATE_WATCH = os.getenv('TEMPLATE_WATCH', '0') == '1'
+TEMPLATE_LOADERS = [
+    'django.template.loaders.filesystem.Loader',
+    'django.template.loaders.app_directories.Loader',
+]
+if TEMPLATE_CACHE:
+    TEMPLATE_LOADERS = [
+        ('django.template.loaders.cached.Loader', TEMPLATE_LOADERS),
+    ]
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'core.profiling.ProfiledTemplates',
         'DIRS': [TEMPLATES_DIR],
-        'APP_DIRS': True,
         'OPTIONS': {
+            'loaders': TEMPLATE_LOADERS,
             'context_processors': [
                 'django.template.context_processors.debug',
                 'django.template.context_processors.request',
@@ -69,11 +100,45 @@ WSGI_APPLICATION = 'yatube.wsgi.application'
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        'ENGINE': 'core.db',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', 60)),
+        'OPTIONS': {
+            'timeout': 20,
+            'immediate_transactions': True,
+            'pragmas': {
+                'journal_mode': 'wal',
+                'synchronous': 'normal',
+                'mmap_size': 256 * 1024 * 1024,
+                'cache_size': -64 * 1024,
+                'busy_timeout': 20 * 1000,
+                'temp_store': 'memory',
+            },
+        },
     }
 }
 
+DATABASE_REPLICAS = []
+for number, path in enumerate(
+        filter(None, os.getenv('DB_REPLICAS', '').split(',')), start=1):
+    DATABASES[f'replica{number}'] = {
+        **DATABASES['default'],
+        'NAME': os.path.join(BASE_DIR, path),
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(f'replica{number}')
+DATABASE_ROUTERS = ['core.db.replicas.ReplicaRouter']
+REPLICA_PIN_SECONDS = 10
+
+PROFILING_SAMPLE_RATE = float(os.getenv('PROFILING_SAMPLE_RATE', 0))
+PROFILING_SLOW_QUERY_MS = int(os.getenv('PROFILING_SLOW_QUERY_MS', 100))
+PROFILING_STATS_DIR = os.path.join(BASE_DIR, 'profiling')
+PROFILING_DUMP_INTERVAL = 60
+METRICS_DB = os.path.join(TEST_DIR if TESTING else BASE_DIR, 'metrics',
+                          'metrics.sqlite3')
+METRICS_FLUSH_INTERVAL = 5
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -101,8 +166,18 @@ USE_TZ = True
 
 STATICFILES_DIRS = (os.path.join(BASE_DIR, 'static'),)
 STATIC_URL = '/static/'
+STATIC_ROOT = os.getenv('STATIC_ROOT', os.path.join(BASE_DIR, 'static_root'))
+if PRODUCTION:
+    STATICFILES_STORAGE = 'core.static.CompressedManifestStaticFilesStorage'
+# Раздавать статику и медиафайлы из процесса WSGI, если перед ним нет
+# прокси, который делает это сам.
+STATIC_SERVE = os.getenv('STATIC_SERVE', '1' if PRODUCTION else '0') == '1'
+STATIC_MAX_AGE = 60 * 60
 
 POSTS_LIMIT = 10
+COMMENTS_LIMIT = 10
+POSTS_KEYSET_PAGINATION = False
+FEED_FANOUT_LIMIT = 1000
 
 LOGIN_URL = 'users:login'
 LOGIN_REDIRECT_URL = 'posts:index'
@@ -111,13 +186,49 @@ EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 
 MEDIA_URL = '/media/'
-MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
-
-CACHES = {
-    'default': {
+MEDIA_ROOT = os.getenv('MEDIA_ROOT', os.path.join(BASE_DIR, 'media'))
+# В тестах фоновые миниатюры не переживали бы тест и его временный
+# MEDIA_ROOT.
+THUMBNAIL_WORKERS = 0 if TESTING else int(os.getenv('THUMBNAIL_WORKERS', 2))
+
+FILE_UPLOAD_HANDLERS = ['posts.uploads.LimitedUploadHandler']
+UPLOAD_MAX_SIZE = 10 * 1024 * 1024
+IMAGE_MAX_PIXELS = 40 * 10 ** 6
+IMAGE_MASTER_SIZE = 2560
+
+CACHE_DIR = os.path.join(TEST_DIR if TESTING else BASE_DIR, 'cache')
+CACHE_BACKENDS = {
+    'sqlite': {
+        'BACKEND': 'core.cache.SQLiteCache',
+        'LOCATION': os.path.join(CACHE_DIR, 'cache.sqlite3'),
+        'OPTIONS': {
+            'MAX_ENTRIES': 20000,
+            'MAX_SIZE': 256 * 1024 * 1024,
+        },
+    },
+    'file': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(CACHE_DIR, 'files'),
+        'OPTIONS': {
+            'MAX_ENTRIES': 20000,
+        },
+    },
+    'locmem': {
         'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-    }
+    },
+}
+CACHES = {
+    'default': CACHE_BACKENDS[
+        os.getenv('CACHE_BACKEND', 'locmem' if TESTING else 'sqlite')],
 }
+FEED_CACHE_TIMEOUT = 60 * 60 * 6
+REPLICA_FEED_CACHE_TIMEOUT = 60
+
+if PRODUCTION:
+    # Прокси завершает HTTPS и передаёт схему в X-Forwarded-Proto.
+    SECURE_PROXY_SSL_HEADER = ('HTTP_X_FORWARDED_PROTO', 'https')
+    SESSION_COOKIE_SECURE = True
+    CSRF_COOKIE_SECURE = True
 
 AUTH_USER_MODEL = 'posts.User'
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
@@ -14,3 +14,15 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yatube.settings')
 
 application = get_wsgi_application()
+
+from django.conf import settings  # noqa: E402
+
+from core import checks, static, template_cache  # noqa: E402
+
+if settings.STATIC_SERVE:
+    application = static.StaticFilesApplication(application)
+
+checks.require_secret_key()
+checks.report_debug_components()
+template_cache.warm_up()
+template_cache.start_watcher()